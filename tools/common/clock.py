@@ -0,0 +1,106 @@
+import threading
+import time
+from typing import Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class Clock:
+    """monotonic time source of scenarios, device timeouts, timeline and simulator physics"""
+
+    virtual: bool = False
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def forked(self, fn: Callable[[], T]) -> Callable[[], T]:
+        """
+        wraps fn which runs concurrently with the calling thread (on a pool thread or on the caller itself),
+        all tasks of a group are forked before any of them is started
+        """
+        return fn
+
+
+class VirtualClock(Clock):
+    """
+    sleep() returns at once and moves the clock forward instead, real time still passes between sleeps,
+    so I/O of simulated devices keeps its (short) real duration.
+    Forked tasks run on their own time lines starting at the time of the fork, so their sleeps overlap:
+    the shared clock moves to the latest of them, the forking thread continues from there once joined
+    """
+
+    virtual = True
+
+    def __init__(self):
+        # shared time line: latest time reached
+        self._offset = 0.0
+        # time lines of threads running forked tasks, by thread ident
+        self._offsets: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return time.monotonic() + self._offsets.get(threading.get_ident(), self._offset)
+
+    def sleep(self, seconds: float):
+        if seconds <= 0:
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            offset = self._offsets.get(ident)
+            if offset is None:
+                self._offset += seconds
+            else:
+                self._offsets[ident] = offset + seconds
+                self._offset = max(self._offset, offset + seconds)
+        # lets other threads run as a real sleep would
+        time.sleep(0)
+
+    def forked(self, fn: Callable[[], T]) -> Callable[[], T]:
+        parent = threading.get_ident()
+        with self._lock:
+            start = self._offsets.get(parent, self._offset)
+
+        def run() -> T:
+            ident = threading.get_ident()
+            with self._lock:
+                outer = self._offsets.get(ident)
+                self._offsets[ident] = start
+            try:
+                return fn()
+            finally:
+                with self._lock:
+                    end = self._offsets.pop(ident)
+                    if outer is not None:
+                        self._offsets[ident] = outer
+                    # a forked parent joins at the latest of its tasks, others follow the shared time line
+                    if parent in self._offsets:
+                        self._offsets[parent] = max(self._offsets[parent], end)
+
+        return run
+
+
+_clock: Clock = Clock()
+
+
+def set_clock(clock: Clock):
+    global _clock
+    _clock = clock
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def now() -> float:
+    return _clock.now()
+
+
+def sleep(seconds: float):
+    _clock.sleep(seconds)
+
+
+def forked(fn: Callable[[], T]) -> Callable[[], T]:
+    return _clock.forked(fn)
@@ -3,6 +3,7 @@ import sys
 from enum import Enum
 from glob import glob
 from os import path
+from typing import NamedTuple, Optional, List, Dict, Tuple, Callable
 
 from serial.tools import list_ports
 
@@ -17,34 +18,97 @@ class UartStr(Enum):
     CH340 = 'CH340'
 
 
-logger = Logger("esp")
+# USB bridge VID/PID, used where port description does not contain the chip name (Linux)
+UART_IDS = {
+    UartStr.CP210: [(0x10C4, 0xEA60), (0x10C4, 0xEA70)],
+    UartStr.CH340: [(0x1A86, 0x7523), (0x1A86, 0x5523)],
+}
 
+SERIAL_BY_ID = "/dev/serial/by-id"
 
-def _detect_port_win(uart_str: UartStr):
-    info_list = list_ports.comports()
-    info_list = sorted(info_list, key=lambda i: i.device)
-    port = ''
-    port_count = 0
-    for info in info_list:
-        if uart_str.value in info.description:
-            logger.trace(info.description)
-            port = info.device
-            port_count += 1
+logger = Logger("esp")
 
-    if port_count == 0:
-        logger.throw("Device not found!")
 
-    if port_count > 1:
-        logger.throw("Too many ports found: only one device should be connected.")
+class PortInfo(NamedTuple):
+    device: str
+    serial_number: Optional[str]
+    description: str
 
-    return port
+
+_port_cache: Dict[Tuple[UartStr, Optional[str]], str] = {}
+_port_cache_signature: Optional[Tuple] = None
 
 
-def detect_port(uart_str: UartStr):
+def _hotplug_signature() -> Tuple:
+    """cheap snapshot of attached usb serial devices"""
     if os.name == "nt":
-        return _detect_port_win(uart_str)
-    else:
-        raise LoggedError("Not supported")
+        # no by-id links on Windows and enumerating ports is as slow as detecting them: the cache is dropped
+        # when a cached port fails to open (see EdproDeviceBase) or by invalidate_ports()
+        return ()
+    try:
+        return tuple(sorted(os.listdir(SERIAL_BY_ID)))
+    except OSError:
+        return ()
+
+
+def invalidate_ports():
+    global _port_cache_signature
+    _port_cache.clear()
+    _port_cache_signature = None
+
+
+def _is_uart(info, uart_str: UartStr) -> bool:
+    if uart_str.value in (info.description or ""):
+        return True
+    return (info.vid, info.pid) in UART_IDS[uart_str]
+
+
+def find_ports(uart_str: UartStr, serial_number: Optional[str] = None) -> List[PortInfo]:
+    result = []
+    for info in sorted(list_ports.comports(), key=lambda i: i.device):
+        if not _is_uart(info, uart_str):
+            continue
+        if serial_number is not None and info.serial_number != serial_number:
+            continue
+        result.append(PortInfo(device=info.device,
+                               serial_number=info.serial_number,
+                               description=info.description))
+    return result
+
+
+def _detect_port(uart_str: UartStr, serial_number: Optional[str]) -> str:
+    found = find_ports(uart_str, serial_number)
+    for info in found:
+        logger.trace("%s [%s]: %s", info.description, info.serial_number, info.device)
+
+    if len(found) == 0:
+        logger.throw("Device not found!")
+
+    if len(found) > 1:
+        logger.throw("Too many ports found: only one device should be connected"
+                     " or device serial number must be specified.")
+
+    return found[0].device
+
+
+def detect_port(uart_str: UartStr, serial_number: Optional[str] = None) -> str:
+    """
+    resolves device port by usb bridge type (and serial number, when several devices are attached),
+    results are cached for the session and dropped when usb serial devices are plugged or unplugged
+    (on Windows: when a cached port fails to open)
+    """
+    global _port_cache_signature
+    signature = _hotplug_signature()
+    if signature != _port_cache_signature:
+        _port_cache.clear()
+        _port_cache_signature = signature
+
+    key = (uart_str, serial_number)
+    port = _port_cache.get(key)
+    if port is None:
+        port = _detect_port(uart_str, serial_number)
+        _port_cache[key] = port
+    return port
 
 
 def _find_elf_file(bin_dir: str):
@@ -59,15 +123,25 @@ def _find_elf_file(bin_dir: str):
     return path.normpath(found_files[0])
 
 
+# called with the port before it is flashed: a flashed (or partially flashed) device restarts with other firmware,
+# the devices layer registers here to validate it again
+flash_listeners: List[Callable[[str], None]] = []
+
+
+def _notify_flash(port: str):
+    for listener in flash_listeners:
+        listener(port)
+
+
 def esptool(*args):
     cmd = [sys.executable, '-m', 'esptool']
     cmd.extend(args)
     run_shell(cmd)
 
 
-def print_esp_info(uart_str: UartStr):
+def print_esp_info(uart_str: UartStr, serial_number: Optional[str] = None):
     try:
-        port = detect_port(uart_str)
+        port = detect_port(uart_str, serial_number)
         esptool('--port', port,
                 '--chip', 'esp8266',
                 '--no-stub',
@@ -76,10 +150,11 @@ def print_esp_info(uart_str: UartStr):
         pass
 
 
-def flash_firmware(bin_dir: str, uart_str: UartStr):
+def flash_firmware(bin_dir: str, uart_str: UartStr, serial_number: Optional[str] = None):
     success = False
     try:
-        port = detect_port(uart_str)
+        port = detect_port(uart_str, serial_number)
+        _notify_flash(port)
         elf = _find_elf_file(bin_dir)
         delete_files(bin_dir, '*.bin')
         esptool('elf2image', elf)
@@ -100,10 +175,11 @@ def flash_firmware(bin_dir: str, uart_str: UartStr):
     return success
 
 
-def flash_espinit(uart_str: UartStr) -> bool:
+def flash_espinit(uart_str: UartStr, serial_number: Optional[str] = None) -> bool:
     success = False
     try:
-        port = detect_port(uart_str)
+        port = detect_port(uart_str, serial_number)
+        _notify_flash(port)
         esptool('--port', port,
                 '--baud', ESP_FLASH_BAUD,
                 '--chip', 'esp8266',
@@ -1,39 +1,158 @@
-from tools.common.screen import Colors, scr_init
+import atexit
+import os
+import queue
+import threading
+import time
+from enum import IntEnum
+from typing import Dict, Optional, TextIO
+
+from tools.common.screen import Colors, scr_init, scr_write
 
 
 class LoggedError(Exception):
     pass
 
 
+class LogLevel(IntEnum):
+    TRACE = 0
+    INFO = 1
+    WARN = 2
+    ERROR = 3
+    OFF = 4
+
+
+_default_level: LogLevel = LogLevel.TRACE
+_tag_levels: Dict[str, LogLevel] = {}
+
+
+def set_log_level(level: LogLevel, tag: Optional[str] = None):
+    global _default_level
+    if tag is None:
+        _default_level = level
+    else:
+        _tag_levels[tag] = level
+
+
+def set_log_levels(spec: str):
+    """
+    spec format: "<default>,<tag>=<level>,..." e.g. "info,mm=trace,ri_meter=warn"
+    """
+    for item in spec.split(","):
+        item = item.strip()
+        if item == "":
+            continue
+        tag, sep, name = item.rpartition("=")
+        set_log_level(LogLevel[name.strip().upper()], tag.strip() if sep else None)
+
+
+class LogWriter:
+    """writes log output from a background thread, batching console and session file writes"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._queue: queue.Queue = queue.Queue()
+        self._file: Optional[TextIO] = open(path, "a", encoding="utf-8") if path else None
+        self._thread = threading.Thread(target=self._writer_proc, name='log')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, console_text: str, file_text: str):
+        self._queue.put((console_text, file_text))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+
+    def _writer_proc(self):
+        alive = True
+        while alive:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                alive = False
+                batch = [item for item in batch if item is not None]
+
+            scr_write("".join(console + "\n" for console, _ in batch))
+            if self._file is not None:
+                self._file.write("".join(file + "\n" for _, file in batch))
+                self._file.flush()
+
+
+_writer: Optional[LogWriter] = None
+
+
+def start_log_writer(path: Optional[str] = None):
+    global _writer
+    stop_log_writer()
+    _writer = LogWriter(path)
+
+
+def stop_log_writer():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
 class Logger:
 
     def __init__(self, tag):
         self.tag = tag
         scr_init()
 
-    def print(self, color, msg):
-        print(f"{color}[{self.tag}] {msg}{Colors.RESET}")
+    def enabled(self, level: LogLevel) -> bool:
+        return level >= _tag_levels.get(self.tag, _default_level)
 
-    def trace(self, msg):
-        self.print(Colors.GRAY, msg)
+    def print(self, color, msg):
+        text = f"[{self.tag}] {msg}"
+        if _writer is None:
+            scr_write(f"{color}{text}{Colors.RESET}\n")
+        else:
+            stamp = time.strftime("%H:%M:%S")
+            _writer.write(f"{color}{text}{Colors.RESET}", f"{stamp} {text}")
+
+    def _log(self, level: LogLevel, color, msg, args):
+        # message is formatted only when the level is enabled: logger.trace("<- %s", cmd)
+        if not self.enabled(level):
+            return
+        if args:
+            msg = msg % args
+        self.print(color, msg)
+
+    def trace(self, msg, *args):
+        self._log(LogLevel.TRACE, Colors.GRAY, msg, args)
 
     def success(self, msg="OK"):
-        self.print(Colors.GREEN, msg)
+        self._log(LogLevel.INFO, Colors.GREEN, msg, ())
 
-    def info(self, msg):
-        self.print(Colors.LIGHT_BLUE, msg)
+    def info(self, msg, *args):
+        self._log(LogLevel.INFO, Colors.LIGHT_BLUE, msg, args)
 
-    def warn(self, msg):
-        self.print(Colors.YELLOW, msg)
+    def warn(self, msg, *args):
+        self._log(LogLevel.WARN, Colors.YELLOW, msg, args)
 
     def error(self, msg):
-        self.print(Colors.LIGHT_RED, "Error: " + str(msg))
+        self._log(LogLevel.ERROR, Colors.LIGHT_RED, "Error: " + str(msg), ())
 
     def throw(self, msg):
         self.error(str(msg))
         raise LoggedError(msg)
 
 
+if os.environ.get("AMP_LOG"):
+    set_log_levels(os.environ["AMP_LOG"])
+
+# AMP_LOG_FILE=<path>: log output goes through the background writer and is appended to the session file
+if os.environ.get("AMP_LOG_FILE"):
+    start_log_writer(os.environ["AMP_LOG_FILE"])
+    atexit.register(stop_log_writer)
+
+
 def main():
     logger = Logger("tag")
     logger.trace("trace")
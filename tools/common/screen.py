@@ -1,8 +1,13 @@
 import ctypes
 import os
+import sys
+import threading
 
 win_console_initialized = False
 
+# loggers and the device log write from several threads
+_console_lock = threading.Lock()
+
 
 def scr_init():
     global win_console_initialized
@@ -38,8 +43,15 @@ class Colors:
     RESET = '\033[0m'
 
 
+def scr_write(text: str):
+    """writes complete lines to the console in one call, so lines of concurrent writers are never glued"""
+    with _console_lock:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
 def scr_print(msg: str, color: str):
-    print(f'{color}{msg}{Colors.RESET}')
+    scr_write(f'{color}{msg}{Colors.RESET}\n')
 
 
 def scr_prompt(msg: str):
@@ -0,0 +1,184 @@
+import json
+import threading
+from bisect import bisect_left
+from typing import List, Dict, Tuple, Optional, NamedTuple
+
+from tools.common import clock
+
+# histogram bucket upper bounds, ms
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# deliberate delays (Scenario.wait), counted separately from instrument I/O
+WAIT = "wait"
+# test point spans (Scenario.points), they enclose waits and I/O
+POINT = "point"
+
+
+class Span(NamedTuple):
+    category: str
+    name: str
+    start: float
+    end: float
+
+
+def command_key(cmd: str) -> str:
+    """groups commands by their non-numeric part: 'set l 50' -> 'set l', ':FUNC:SINE:FREQ 1000' -> ':FUNC:SINE:FREQ'"""
+    words = []
+    for word in cmd.split():
+        if word[0].isdigit() or word[0] in "-+.":
+            break
+        words.append(word)
+    return " ".join(words) or cmd
+
+
+def busy_time(spans: List[Span]) -> float:
+    """length of the union of span intervals, overlapping (concurrent) spans are counted once"""
+    total = 0.0
+    end = None
+    for span in sorted(spans, key=lambda s: s.start):
+        if end is None or span.start > end:
+            total += span.end - span.start
+            end = span.end
+        elif span.end > end:
+            total += span.end - end
+            end = span.end
+    return total
+
+
+class LatencyStats:
+    def __init__(self):
+        self.durations: List[float] = []
+
+    def add(self, duration: float):
+        self.durations.append(duration)
+
+    def percentile(self, p: float) -> float:
+        values = sorted(self.durations)
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    def buckets(self) -> List[int]:
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for duration in self.durations:
+            counts[bisect_left(BUCKETS_MS, duration * 1000)] += 1
+        return counts
+
+    def summary_str(self) -> str:
+        return f"n={len(self.durations):<5}" \
+               f" total={sum(self.durations):8.3f}s" \
+               f" p50={self.percentile(0.5) * 1000:7.1f}ms" \
+               f" p90={self.percentile(0.9) * 1000:7.1f}ms" \
+               f" max={max(self.durations) * 1000:7.1f}ms"
+
+
+class Timeline:
+    """collects timed spans of instrument I/O and waits, exported as Chrome trace (chrome://tracing, Perfetto)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Span] = []
+        self.time_start = clock.now()
+        self._lock = threading.Lock()
+
+    def add(self, category: str, name: str, start: float, end: float):
+        with self._lock:
+            self.spans.append(Span(category, name, start, end))
+
+    def latency_stats(self) -> Dict[Tuple[str, str], LatencyStats]:
+        stats: Dict[Tuple[str, str], LatencyStats] = {}
+        for span in self.spans:
+            if span.category == POINT:
+                continue
+            key = (span.category, command_key(span.name))
+            if key not in stats:
+                stats[key] = LatencyStats()
+            stats[key].add(span.end - span.start)
+        return stats
+
+    def budget(self, top_n: int = 10) -> Dict:
+        """
+        wall time split into deliberate waits, I/O of every instrument and the rest (python compute),
+        with the slowest test points and their own split
+        """
+        time_end = clock.now()
+        points = [span for span in self.spans if span.category == POINT]
+        spans = [span for span in self.spans if span.category != POINT]
+
+        def split(begin: float, end: float) -> Dict:
+            inner = [span for span in spans if begin <= span.start and span.end <= end]
+            io: Dict[str, float] = {}
+            for span in inner:
+                if span.category != WAIT:
+                    io[span.category] = io.get(span.category, 0.0) + span.end - span.start
+            return {"total": end - begin,
+                    "wait": sum(span.end - span.start for span in inner if span.category == WAIT),
+                    "io": io,
+                    "compute": max(0.0, end - begin - busy_time(inner))}
+
+        result = split(self.time_start, time_end)
+        result["name"] = self.name
+        result["points"] = len(points)
+        slowest = sorted(points, key=lambda s: s.start - s.end)[:top_n]
+        result["slowest_points"] = [dict(point=span.name, **split(span.start, span.end)) for span in slowest]
+        return result
+
+    def summary_lines(self) -> List[str]:
+        stats = self.latency_stats()
+        keys = sorted(stats.keys(), key=lambda k: -sum(stats[k].durations))
+        width = max((len(f"{c}: {n}") for c, n in keys), default=0)
+        return [f"{f'{c}: {n}'.ljust(width)} | {stats[(c, n)].summary_str()}" for c, n in keys]
+
+    def to_chrome_trace(self) -> Dict:
+        tids: Dict[str, int] = {}
+        events = []
+        for span in self.spans:
+            if span.category not in tids:
+                tids[span.category] = len(tids) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tids[span.category],
+                               "args": {"name": span.category}})
+            events.append({"name": span.name,
+                           "cat": span.category,
+                           "ph": "X",
+                           "pid": 1,
+                           "tid": tids[span.category],
+                           "ts": round((span.start - self.time_start) * 1e6),
+                           "dur": round((span.end - span.start) * 1e6)})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"name": self.name, "histograms": self.histograms()}}
+
+    def histograms(self) -> List[Dict]:
+        """latency bucket counts per instrument and command, bucket i counts durations <= BUCKETS_MS[i]"""
+        return [{"instrument": category,
+                 "command": name,
+                 "buckets_ms": BUCKETS_MS,
+                 "counts": stats.buckets(),
+                 "total": sum(stats.durations)}
+                for (category, name), stats in self.latency_stats().items()]
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+_active: Optional[Timeline] = None
+
+
+def start_timeline(name: str) -> Timeline:
+    global _active
+    _active = Timeline(name)
+    return _active
+
+
+def stop_timeline():
+    global _active
+    _active = None
+
+
+def active_timeline() -> Optional[Timeline]:
+    return _active
+
+
+def record(category: str, name: str, start: float):
+    """adds span [start, now] to the active timeline, start is clock.now()"""
+    timeline = _active
+    if timeline is not None:
+        timeline.add(category, name, start, clock.now())
@@ -0,0 +1,197 @@
+import asyncio
+import os
+from typing import Optional, Dict, List, Any
+
+import serial
+
+from tools.common import clock, timeline
+from tools.common.logger import LoggedError
+from tools.devices.edpro_base import EdproDeviceBase, RESPONSE_TIMEOUT, decode_device_line
+from tools.devices.edpro_log import device_log
+
+# used when the port has no selectable file descriptor (Windows, loop:// urls)
+RX_POLL_INTERVAL = 0.002
+
+
+class AsyncEdproDevice(EdproDeviceBase):
+    """
+    asyncio counterpart of EdproDevice: no rx thread, the port is read from the event loop,
+    so several devices and instruments can be driven concurrently from one loop
+    """
+
+    def __init__(self, tag="edpro_device"):
+        super().__init__(tag)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._rx_task: Optional[asyncio.Task] = None
+        self._rx_fd: Optional[int] = None
+        self._responses: Optional[asyncio.Queue] = None
+        # held across write and wait, so responses of concurrent requests are not mixed up
+        self._request_lock: Optional[asyncio.Lock] = None
+
+    def _on_device_line(self, data: memoryview):
+        line = decode_device_line(data)
+        self._print_device_line(line)
+        if line.startswith(":"):
+            self._responses.put_nowait(line)
+
+    def _read_available(self):
+        while self._serial.in_waiting > 0:
+            self._rx_parser.read_from(self._serial, self._serial.in_waiting)
+            for data in self._rx_parser.lines():
+                self._on_device_line(data)
+
+    async def _poll_proc(self):
+        try:
+            while True:
+                self._read_available()
+                await asyncio.sleep(RX_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.logger.error(e)
+            raise
+
+    def _start_reader(self):
+        self._loop = asyncio.get_running_loop()
+        self._responses = asyncio.Queue()
+        self._request_lock = asyncio.Lock()
+        try:
+            fd = self._serial.fileno()
+        except (AttributeError, OSError, serial.SerialException):
+            fd = None
+        if fd is not None and os.name != "nt":
+            self._loop.add_reader(fd, self._read_available)
+            self._rx_fd = fd
+        else:
+            self._rx_task = self._loop.create_task(self._poll_proc())
+
+    def _stop_reader(self):
+        """uses the loop the reader was started on, so close() works outside of it as well"""
+        if self._rx_fd is not None:
+            if not self._loop.is_closed():
+                self._loop.remove_reader(self._rx_fd)
+            self._rx_fd = None
+        if self._rx_task is not None:
+            if not self._loop.is_closed():
+                self._rx_task.cancel()
+            self._rx_task = None
+        self._loop = None
+
+    async def connect(self, reboot: bool = True):
+        self.logger.info("connect")
+        self._serial = self._open_serial(reboot, timeout=0)
+
+        self._reset_skipped = False
+        if reboot:
+            try:
+                await asyncio.sleep(0.1)
+                self._serial.dtr = True
+                await asyncio.sleep(0.1)
+                self._serial.rts = False
+            except OSError as e:
+                self._on_reset_unsupported(e)
+
+        self._start_reader()
+
+    def close(self):
+        if self._serial is None:
+            return
+        if self.stats.count > 0:
+            self.logger.trace(self.stats.summary_str())
+        self.logger.trace("disconnect")
+        self._stop_reader()
+        device_log.flush()
+        self._serial.close()
+        self._serial = None
+
+    async def _wait_response(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._responses.get(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+
+    async def request(self, cmd: str, wait: bool = True, trace: bool = True) -> Dict[str, str]:
+        return (await self.request_many([cmd], wait, trace))[0]
+
+    async def _request_lines(self, cmds: List[str], wait: bool, trace: bool) -> List[str]:
+        self._trace_commands(cmds, trace)
+
+        async with self._request_lock:
+            while not self._responses.empty():
+                self._responses.get_nowait()
+
+            time_start = clock.now()
+            self._serial.write(self._encode_commands(cmds))
+
+            if not wait:
+                timeline.record(self.tag, "; ".join(cmds), time_start)
+                return []
+
+            lines = []
+            for cmd in cmds:
+                line = await self._wait_response(RESPONSE_TIMEOUT)
+                if line is None:
+                    self.logger.throw(f"Request timeout: '{cmd}'")
+                lines.append(line)
+        self.stats.add(clock.now() - time_start)
+        timeline.record(self.tag, "; ".join(cmds), time_start)
+        return lines
+
+    async def request_many(self, cmds: List[str], wait: bool = True, trace: bool = True) -> List[Dict[str, str]]:
+        lines = await self._request_lines(cmds, wait, trace)
+        if not wait:
+            return [{} for _ in cmds]
+        return self._decode_responses(lines, trace)
+
+    async def query_many(self, cmds: List[str], trace: bool = True) -> List[Any]:
+        return self._decode_results(cmds, await self._request_lines(cmds, True, trace), trace)
+
+    async def query(self, cmd: str, trace: bool = True) -> Any:
+        return (await self.query_many([cmd], trace))[0]
+
+    async def cmd(self, cmd: str):
+        await self.cmd_many([cmd])
+
+    async def cmd_many(self, cmds: List[str]):
+        self._check_commands(cmds, await self._request_lines(cmds, True, True))
+
+    async def wait_boot_complete(self):
+        if self._boot_skipped():
+            return
+        self.logger.info("waiting for boot complete...")
+
+        deadline = clock.now() + RESPONSE_TIMEOUT
+
+        async with self._request_lock:
+            while True:
+                line = await self._wait_response(deadline - clock.now())
+                if line is None:
+                    self.logger.throw("Waiting timeout!")
+                if self._is_boot_complete(line):
+                    break
+
+        self.logger.info("ready")
+
+    async def validate_firmware(self):
+        self._check_firmware(await self.get_info())
+
+    async def set_devmode(self):
+        await self.request("devmode")
+
+
+async def test():
+    device = AsyncEdproDevice()
+    await device.connect()
+    try:
+        await device.wait_boot_complete()
+        await device.set_devmode()
+        await device.get_info()
+    finally:
+        device.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test())
+    except LoggedError:
+        pass
@@ -1,24 +1,30 @@
+import math
+import os
+import queue
 import threading
-import time
-from typing import Optional, Dict, NamedTuple
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, NamedTuple, List, Deque, Iterator, Callable, Any, Type
 
 import serial
 
-from tools.common.esp import detect_port, UartStr
+from tools.common import clock, timeline
+from tools.common.esp import detect_port, invalidate_ports, flash_listeners, UartStr
 from tools.common.logger import Logger, LoggedError
 from tools.common.screen import Colors, scr_print, scr_pause
+from tools.devices.edpro_log import device_log
 
+# amp://<model> urls are served by the firmware emulator (tools/emulator/protocol_amp.py)
+if "tools.emulator" not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append("tools.emulator")
 
-def decode_device_line(data: bytes) -> str:
+
+def decode_device_line(data: memoryview) -> str:
+    """data is a single line without terminator, as produced by LineParser"""
     try:
-        line = data.decode("utf-8")
-        line = line.replace("\r", "")
-        line = line.replace("\n", "")
-        return line
+        return str(data, "utf-8")
     except UnicodeDecodeError:
-        data = data.replace(b"\r", b"")
-        data = data.replace(b"\n", b"")
-        return str(data)
+        return str(bytes(data))
 
 
 def decode_response(raw: str) -> Dict[str, str]:
@@ -31,13 +37,234 @@ def decode_response(raw: str) -> Dict[str, str]:
     return result
 
 
+class LineParser:
+    """
+    incremental line splitter over a reusable receive buffer:
+    bytes are read in place with readinto(), complete lines are returned as memoryview slices of the buffer
+    """
+
+    def __init__(self, size: int = 4096):
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._end = 0
+
+    def read_from(self, port: serial.Serial, count: int) -> int:
+        count = min(count, len(self._buf) - self._end)
+        received = port.readinto(self._view[self._end:self._end + count]) or 0
+        self._end += received
+        return received
+
+    def lines(self) -> Iterator[memoryview]:
+        """yields complete lines (without CR/LF), each view is valid only until the next iteration"""
+        start = 0
+        while True:
+            pos = self._buf.find(b"\n", start, self._end)
+            if pos < 0:
+                break
+            stop = pos
+            if stop > start and self._buf[stop - 1] == 0x0D:
+                stop -= 1
+            yield self._view[start:stop]
+            start = pos + 1
+
+        if start == 0 and self._end == len(self._buf):
+            # line does not fit the buffer, pass it as is
+            yield self._view[0:self._end]
+            start = self._end
+
+        if start > 0:
+            rest = self._end - start
+            self._buf[0:rest] = bytes(self._view[start:self._end])
+            self._end = rest
+
+
+def to_value(value: str) -> float:
+    """measured value, 'ovf' is reported on overflow"""
+    if value == "ovf":
+        return math.inf
+    return float(value)
+
+
+def to_flag(value: str) -> bool:
+    return value == "1"
+
+
+class ResponseField(NamedTuple):
+    key: str
+    convert: Callable[[str], Any]
+
+
+_MISSING = object()
+
+
+class ResponseSchema:
+    """decodes a ':' response line straight into result_type, fields are listed in result_type order"""
+
+    def __init__(self, result_type: Type[NamedTuple], fields: List[ResponseField], check_success: bool = False):
+        assert len(fields) == len(result_type._fields)
+        self.result_type = result_type
+        self.fields = fields
+        self.check_success = check_success
+        self._index = {f.key: i for i, f in enumerate(fields)}
+
+    def decode(self, raw: str) -> Any:
+        values: List[Any] = [_MISSING] * len(self.fields)
+        success = None
+        for pair in raw.split(" "):
+            key, sep, value = pair.partition("=")
+            if not sep:
+                continue
+            if key == "success":
+                success = value
+            i = self._index.get(key)
+            if i is None:
+                continue
+            try:
+                values[i] = self.fields[i].convert(value)
+            except ValueError:
+                raise ValueError(f"invalid field value: {key}={value}")
+
+        if self.check_success and success != "1":
+            raise ValueError("request not succeed")
+
+        for i, v in enumerate(values):
+            if v is _MISSING:
+                raise ValueError(f"missing field: {self.fields[i].key}")
+
+        return self.result_type(*values)
+
+
 class EDeviceInfo(NamedTuple):
     name: str
     version: str
 
 
-class EdproDevice:
-    """handles communication with amperia devices (multimeter & powersource)"""
+INFO_SCHEMA = ResponseSchema(EDeviceInfo, [
+    ResponseField("name", str),
+    ResponseField("version", str),
+])
+
+class CmdResult(NamedTuple):
+    success: bool
+
+
+# response of a command without a registered schema
+CMD_SCHEMA = ResponseSchema(CmdResult, [
+    ResponseField("success", to_flag),
+])
+
+# response schemas keyed by command, extended by device classes
+BASE_SCHEMAS: Dict[str, ResponseSchema] = {
+    "i": INFO_SCHEMA,
+}
+
+
+def open_device_serial(port: str, reboot: bool, timeout: Optional[float] = 1) -> serial.Serial:
+    """opens device port, keeps RTS asserted when reboot is requested (reset pulse is up to the caller)"""
+    port_serial = serial.serial_for_url(port, 74880,
+                                        parity="N",
+                                        stopbits=1,
+                                        dsrdtr=False,
+                                        rtscts=False,
+                                        xonxoff=False,
+                                        do_not_open=True,
+                                        timeout=timeout)
+
+    if reboot:
+        port_serial.dtr = False
+        port_serial.rts = True
+    else:
+        port_serial.dtr = False
+        port_serial.rts = False
+
+    port_serial.open()
+    return port_serial
+
+
+def check_firmware(logger: Logger, info: EDeviceInfo, expect_name: str, expect_version: str):
+    if (info.name != expect_name):
+        logger.throw(f"Device name do not match!"
+                     f"\n\texpect: {expect_name}"
+                     f"\n\tactual: {info.name}")
+
+    def num_ver(ver: str) -> int:
+        parts = ver.split(".")
+        return int(parts[0]) * 1000 + int(parts[1])
+
+    expect_v = num_ver(expect_version)
+    actual_v = num_ver(info.version)
+    if (actual_v < expect_v):
+        logger.throw(f"Device version do not match!"
+                     f"\n\texpect: {expect_version}"
+                     f"\n\tactual: {info.version}")
+
+
+POLL_INTERVAL = 0.1
+RESPONSE_TIMEOUT = 4
+ATTACH_PROBE_TIMEOUT = 0.3
+
+
+# devices validated in this session, by port: allows to attach without reboot
+_attach_cache: Dict[str, EDeviceInfo] = {}
+
+
+def forget_attached(port: str):
+    """next attach() to the port reboots and validates the device (e.g. it has been flashed)"""
+    _attach_cache.pop(port, None)
+
+
+flash_listeners.append(forget_attached)
+
+
+class RequestStats:
+    """request latency counters, compared against the former 100 ms polling loop"""
+
+    def __init__(self):
+        self.count: int = 0
+        self.total_time: float = 0
+        self.saved_time: float = 0
+
+    def add(self, elapsed: float):
+        polled = max(1, math.ceil(elapsed / POLL_INTERVAL)) * POLL_INTERVAL
+        self.count += 1
+        self.total_time += elapsed
+        self.saved_time += polled - elapsed
+
+    def summary_str(self) -> str:
+        avg_ms = self.total_time / self.count * 1000 if self.count else 0
+        return f"requests: {self.count}, avg: {avg_ms:0.1f}ms, saved: {self.saved_time:0.2f}s"
+
+
+class StreamSample(NamedTuple):
+    timestamp: float
+    value: Any
+
+
+class StreamStats:
+    def __init__(self, rate_hz: float):
+        self.rate_hz = rate_hz
+        self.count: int = 0
+        # ticks whose device query took longer than the period (consumer backpressure is not counted)
+        self.late: int = 0
+        self.time_start: float = clock.now()
+        self.time_last: float = self.time_start
+
+    def achieved_hz(self) -> float:
+        elapsed = self.time_last - self.time_start
+        return (self.count - 1) / elapsed if self.count > 1 and elapsed > 0 else 0
+
+    def summary_str(self) -> str:
+        return f"stream: {self.count} samples, rate: {self.achieved_hz():0.1f}/{self.rate_hz:0.1f}Hz, late: {self.late}"
+
+
+class EdproDeviceBase:
+    """
+    state and protocol shared by EdproDevice and AsyncEdproDevice: command encoding, response decoding
+    and checks; port i/o is up to the subclasses. Command helpers return what cmd()/query() return,
+    so they serve both (the async device awaits the result)
+    """
+
+    schemas: Dict[str, ResponseSchema] = BASE_SCHEMAS
 
     def __init__(self, tag="edpro_device"):
         self.expect_name = "noname"
@@ -46,53 +273,150 @@ class EdproDevice:
         self.tag = tag
         self.logger = Logger(tag)
         self.trace_commands = True
-        self.trace_commands = True
         self.uart_str: UartStr = UartStr.CP210
+        # explicit port name or serial url (e.g. amp://multimeter), detected by uart_str when not set
+        self.port: Optional[str] = os.environ.get(f"AMP_PORT_{tag.upper()}")
+        # selects one of several attached devices of the same type
+        self.serial_number: Optional[str] = os.environ.get(f"AMP_SERIAL_{tag.upper()}")
+        # firmware info, set once the device is validated
+        self.info: Optional[EDeviceInfo] = None
         self._port: Optional[str] = None
         self._serial: Optional[serial.Serial] = None
-        self._rx_thread: Optional[threading.Thread] = None
-        self._rx_alive: bool = False
-        self._response: Optional[str] = None
-        self._lock = threading.Lock()
+        self._rx_parser = LineParser()
         self._uart_written = False
+        # set when the port has no modem control lines (pseudo terminal), the device keeps running
+        self._reset_skipped = False
+        self.stats = RequestStats()
+
+    def _open_serial(self, reboot: bool, timeout: Optional[float]) -> serial.Serial:
+        """
+        opens the configured or detected port; a detected port that fails to open may be stale
+        (device replugged under another name), it is detected again and opened once more
+        """
+        self._port = self.port or detect_port(self.uart_str, self.serial_number)
+        try:
+            return open_device_serial(self._port, reboot, timeout)
+        except Exception as e:
+            invalidate_ports()
+            if self.port is not None:
+                self.logger.throw(e)
+            self.logger.warn("%s, detecting port again", e)
+
+        self._port = detect_port(self.uart_str, self.serial_number)
+        try:
+            return open_device_serial(self._port, reboot, timeout)
+        except Exception as e:
+            invalidate_ports()
+            self.logger.throw(e)
+
+    def _on_reset_unsupported(self, e: OSError):
+        self.logger.warn("reset skipped, port has no modem control lines: %s", e)
+        self._reset_skipped = True
+
+    def _boot_skipped(self) -> bool:
+        if self._reset_skipped:
+            self.logger.info("device was not reset, not waiting for boot")
+        return self._reset_skipped
 
     def _print_device_line(self, line: str):
-        if line == "":
-            return
+        device_log.put(self.tag, line, self.log_mode)
+
+    def _encode_commands(self, cmds: List[str]) -> bytes:
+        data = "".join(f"{cmd}\n" for cmd in cmds).encode()
+        if not self._uart_written:
+            # fix uart issue: the first line after connect may be garbled
+            self._uart_written = True
+            data = b"\n" * 8 + data
+        return data
+
+    def _trace_commands(self, cmds: List[str], trace: bool):
+        if self.trace_commands and trace:
+            for cmd in cmds:
+                self.logger.trace("<- '%s'", cmd)
+
+    def _trace_results(self, results: List[Any], trace: bool):
+        if self.trace_commands and trace:
+            for result in results:
+                self.logger.trace("-> %s", result)
+
+    def _decode(self, cmd: str, line: str, schema: ResponseSchema) -> Any:
+        try:
+            return schema.decode(line)
+        except ValueError as e:
+            self.logger.throw(f"Invalid response to '{cmd}': {e}")
+
+    def _decode_responses(self, lines: List[str], trace: bool) -> List[Dict[str, str]]:
+        responses = [decode_response(line) for line in lines]
+        self._trace_results(responses, trace)
+        return responses
+
+    def _decode_results(self, cmds: List[str], lines: List[str], trace: bool) -> List[Any]:
+        """each response is decoded with the schema registered for its command, CmdResult when there is none"""
+        results = [self._decode(cmd, line, self.schemas.get(cmd, CMD_SCHEMA)) for cmd, line in zip(cmds, lines)]
+        self._trace_results(results, trace)
+        return results
+
+    def _check_commands(self, cmds: List[str], lines: List[str]):
+        results = [self._decode(cmd, line, CMD_SCHEMA) for cmd, line in zip(cmds, lines)]
+        self._trace_results(results, True)
+        for cmd, result in zip(cmds, results):
+            if not result.success:
+                self.logger.throw(f"command failed: '{cmd}'")
+
+    def _is_boot_complete(self, line: str) -> bool:
+        response = decode_response(line)
+        self.logger.trace("-> %s", response)
+        if response.get("init") == "0":
+            self.logger.throw("Device init failed!")
+        return response.get("init") == "1"
+
+    def _check_firmware(self, info: EDeviceInfo):
+        check_firmware(self.logger, info, self.expect_name, self.expect_version)
+        self.info = info
+
+    def save_conf(self):
+        return self.cmd("conf s")
+
+    def get_info(self):
+        return self.query("i")
 
-        color = Colors.GRAY
-
-        if self.log_mode:
-            if line.startswith('D '):
-                line = line[2:]
-                color = Colors.GRAY
-            if line.startswith('I '):
-                line = line[2:]
-                color = Colors.LIGHT_BLUE
-            if line.startswith('W '):
-                line = line[2:]
-                color = Colors.YELLOW
-            elif line.startswith('E '):
-                line = line[2:]
-                color = Colors.RED
-            print(f"[{self.tag}] {color}░ {line.strip()}{Colors.RESET}")
-        else:
-            if line.startswith('W '):
-                color = Colors.YELLOW
-            elif line.startswith('E '):
-                color = Colors.RED
-            print(f"[{self.tag}] {color}░ {line.strip()}{Colors.RESET}")
+    def reboot_on_attach(self):
+        """next attach() to the port reboots and validates the device (e.g. to start with the saved configuration)"""
+        if self._port is not None:
+            forget_attached(self._port)
+
+
+class EdproDevice(EdproDeviceBase):
+    """handles communication with amperia devices (multimeter & powersource)"""
+
+    def __init__(self, tag="edpro_device"):
+        super().__init__(tag)
+        self._rx_thread: Optional[threading.Thread] = None
+        self._rx_alive: bool = False
+        self._responses: Deque[str] = deque()
+        self._batch: Optional[List[str]] = None
+        self._lock = threading.Lock()
+        self._response_ready = threading.Condition(self._lock)
+        # held across write and wait, so responses of concurrent requests are not mixed up
+        self._request_lock = threading.Lock()
+        self.stream_stats: Optional[StreamStats] = None
+
+    def _on_device_line(self, data: memoryview):
+        line = decode_device_line(data)
+        self._print_device_line(line)
+        if line.startswith(":"):
+            with self._lock:
+                self._responses.append(line)
+                self._response_ready.notify_all()
 
     def _reader_proc(self):
         try:
             while self._rx_alive:
-                data = self._serial.readline()
-                if data and self._rx_alive:
-                    line = decode_device_line(data)
-                    self._print_device_line(line)
-                    if line.startswith(":"):
-                        with self._lock:
-                            self._response = line
+                # blocks for the first byte (up to the port timeout), then takes everything buffered
+                received = self._rx_parser.read_from(self._serial, max(1, self._serial.in_waiting))
+                if received and self._rx_alive:
+                    for data in self._rx_parser.lines():
+                        self._on_device_line(data)
         except Exception as e:
             self.logger.error(e)
             self._rx_alive = False
@@ -100,39 +424,61 @@ class EdproDevice:
 
     def connect(self, reboot: bool = True):
         self.logger.info("connect")
+        time_start = clock.now()
         self._rx_alive = True
-        self._port = detect_port(self.uart_str)
-
-        self._serial = serial.serial_for_url(self._port, 74880,
-                                             parity="N",
-                                             stopbits=1,
-                                             dsrdtr=False,
-                                             rtscts=False,
-                                             xonxoff=False,
-                                             do_not_open=True,
-                                             timeout=1)
-
-        if reboot:
-            self._serial.dtr = False
-            self._serial.rts = True
-        else:
-            self._serial.dtr = False
-            self._serial.rts = False
-
-        # open
-        try:
-            self._serial.open()
-        except Exception as e:
-            self.logger.throw(e)
+        self._serial = self._open_serial(reboot, timeout=1)
 
+        self._reset_skipped = False
         if reboot:
-            time.sleep(0.1)
-            self._serial.dtr = True
-            time.sleep(0.1)
-            self._serial.rts = False
+            _attach_cache.pop(self._port, None)
+            try:
+                clock.sleep(0.1)
+                self._serial.dtr = True
+                clock.sleep(0.1)
+                self._serial.rts = False
+            except OSError as e:
+                self._on_reset_unsupported(e)
 
         # start reading thread
         self._start_reader()
+        timeline.record(self.tag, "connect", time_start)
+
+    def _probe_info(self) -> Optional[EDeviceInfo]:
+        """asks device info with a short timeout, None when device does not answer properly"""
+        self._write_commands(["i"])
+        line = self._wait_response(clock.now() + ATTACH_PROBE_TIMEOUT)
+        if line is None:
+            return None
+        try:
+            return INFO_SCHEMA.decode(line)
+        except ValueError:
+            return None
+
+    def attach(self, devmode: bool = False) -> bool:
+        """
+        warm attach: opens the port without reset when the device has been validated earlier in this session
+        and still answers with the same info, otherwise reboots and validates it; returns True when attached warm.
+        devmode is sent on the warm path as well: the board may have been reset or swapped since
+        """
+        port = self.port or detect_port(self.uart_str, self.serial_number)
+        cached = _attach_cache.get(port)
+        if cached is not None:
+            self.connect(reboot=False)
+            if self._probe_info() == cached:
+                self.info = cached
+                if devmode:
+                    self.set_devmode()
+                self.logger.info("attached")
+                return True
+            self.logger.warn("device does not answer, rebooting")
+            self.close()
+
+        self.connect(reboot=True)
+        self.wait_boot_complete()
+        self.validate_firmware()
+        if devmode:
+            self.set_devmode()
+        return False
 
     def _start_reader(self):
         # self.logger.trace("starting reader")
@@ -145,88 +491,135 @@ class EdproDevice:
         # self.logger.trace("stopping reader...")
         self._rx_alive = False
         if self._rx_thread:
+            # wakes the reader blocked for the port timeout
+            cancel_read = getattr(self._serial, "cancel_read", None)
+            if cancel_read is not None:
+                cancel_read()
             self._rx_thread.join()
 
     def close(self):
         if self._serial is None:
             return
+        if self.stats.count > 0:
+            self.logger.trace(self.stats.summary_str())
         self.logger.trace("disconnect")
+        time_start = clock.now()
         self._stop_reader()
+        device_log.flush()
+        timeline.record(self.tag, "close", time_start)
 
         # to prevent device being in reset state after serial.Close()
         # self._serial.rts = False
         self._serial.close()
         self._serial = None
 
-    def _fix_uart_issue(self):
-        if self._uart_written:
-            return
-        for i in range(0, 8):
-            self._serial.write(b"\n")
-        self._uart_written = True
-
-    def request(self, cmd: str, wait: bool = True, trace: bool = True) -> Dict[str, str]:
-        if self.trace_commands and trace:
-            self.logger.trace(f"<- '{cmd}'")
-
+    def _wait_response(self, deadline: float) -> Optional[str]:
+        """pops the oldest response line, blocks until the rx thread delivers one or the deadline (clock) passes"""
+        with self._response_ready:
+            while len(self._responses) == 0:
+                remaining = deadline - clock.now()
+                if remaining <= 0:
+                    return None
+                self._response_ready.wait(remaining)
+            return self._responses.popleft()
+
+    def _write_commands(self, cmds: List[str]):
         with self._lock:
-            self._response = None
+            self._responses.clear()
 
-        self._fix_uart_issue()
-        self._serial.write(f"{cmd}\n".encode())
+        self._serial.write(self._encode_commands(cmds))
         self._serial.flush()
 
+    def request(self, cmd: str, wait: bool = True, trace: bool = True) -> Dict[str, str]:
+        self._flush_batch()
+        return self.request_many([cmd], wait, trace)[0]
+
+    def _request_lines(self, cmds: List[str], wait: bool, trace: bool) -> List[str]:
+        """writes all commands in one burst, response lines are matched to commands in FIFO order"""
+        self._trace_commands(cmds, trace)
+
+        with self._request_lock:
+            time_start = clock.now()
+            self._write_commands(cmds)
+
+            if not wait:
+                timeline.record(self.tag, "; ".join(cmds), time_start)
+                return []
+
+            lines = []
+            for cmd in cmds:
+                line = self._wait_response(clock.now() + RESPONSE_TIMEOUT)
+                if line is None:
+                    self.logger.throw(f"Request timeout: '{cmd}'")
+                lines.append(line)
+        self.stats.add(clock.now() - time_start)
+        timeline.record(self.tag, "; ".join(cmds), time_start)
+        return lines
+
+    def request_many(self, cmds: List[str], wait: bool = True, trace: bool = True) -> List[Dict[str, str]]:
+        lines = self._request_lines(cmds, wait, trace)
         if not wait:
-            return {}
+            return [{} for _ in cmds]
+        return self._decode_responses(lines, trace)
 
-        time_start = time.time()
-        timeout = 4
-        response = {}
+    def query_many(self, cmds: List[str], trace: bool = True) -> List[Any]:
+        """sends all commands in one burst, see _decode_results"""
+        self._flush_batch()
+        return self._decode_results(cmds, self._request_lines(cmds, True, trace), trace)
 
-        while True:
-            time.sleep(0.1)
-            if self._response is None:
-                elapsed = time.time() - time_start
-                if elapsed > timeout:
-                    self.logger.throw("Request timeout!")
-                continue
-            with self._lock:
-                assert isinstance(self._response, str)
-                response = decode_response(self._response)
-                break
-
-        if self.trace_commands and trace:
-            self.logger.trace(f"-> {str(response)}")
-        return response
+    def query(self, cmd: str, trace: bool = True) -> Any:
+        """sends cmd and decodes the response with the schema registered for it"""
+        return self.query_many([cmd], trace)[0]
 
     def cmd(self, cmd: str):
-        r = self.request(cmd)
-        if r.get("success") != "1":
-            self.logger.throw("command failed")
+        if self._batch is not None:
+            self._batch.append(cmd)
+            return
+        self.cmd_many([cmd])
+
+    def cmd_many(self, cmds: List[str]):
+        """
+        sends all commands in one burst and checks that each succeeded; a failed command does not stop the ones
+        after it (they are already sent), so steps depending on each other must go through cmd()
+        """
+        self._check_commands(cmds, self._request_lines(cmds, True, True))
+
+    def _flush_batch(self):
+        if not self._batch:
+            return
+        batch = self._batch
+        self._batch = []
+        self.cmd_many(batch)
+
+    @contextmanager
+    def pipeline(self):
+        """
+        collects cmd() calls made inside the block and sends them as one burst on exit,
+        e.g. several devboard routing changes cost a single round trip
+        """
+        self._batch = []
+        try:
+            yield self
+            self._flush_batch()
+        finally:
+            self._batch = None
 
     def wait_boot_complete(self):
+        if self._boot_skipped():
+            return
         self.logger.info("waiting for boot complete...")
 
-        time_start = time.time()
-        timeout = 4
+        time_start = clock.now()
+        deadline = time_start + RESPONSE_TIMEOUT
 
         while True:
-            time.sleep(0.1)
-            if self._response is None:
-                elapsed = time.time() - time_start
-                if elapsed > timeout:
-                    self.logger.throw("Waiting timeout!")
-                continue
-            with self._lock:
-                assert isinstance(self._response, str)
-                response = decode_response(self._response)
-
-            self.logger.trace(f"-> {response}")
-            if response.get("init") == "0":
-                self.logger.throw("Device init failed!")
-            if response.get("init") == "1":
+            line = self._wait_response(deadline)
+            if line is None:
+                self.logger.throw("Waiting timeout!")
+            if self._is_boot_complete(line):
                 break
 
+        timeline.record(self.tag, "boot", time_start)
         self.logger.info("ready")
 
     def show_log(self):
@@ -252,35 +645,85 @@ class EdproDevice:
             self.close()
             raise
 
-    def save_conf(self):
-        self.cmd("conf s")
-
-    def get_info(self) -> EDeviceInfo:
-        r = self.request("i")
-        return EDeviceInfo(name=r["name"],
-                           version=r["version"])
-
     def validate_firmware(self):
-        info = self.get_info()
-        if (info.name != self.expect_name):
-            self.logger.throw(f"Device name do not match!"
-                              f"\n\texpect: {self.expect_name}"
-                              f"\n\tactual: {info.name}")
-
-        def num_ver(ver: str) -> int:
-            parts = ver.split(".")
-            return int(parts[0]) * 1000 + int(parts[1])
-
-        expect_v = num_ver(self.expect_version)
-        actual_v = num_ver(info.version)
-        if (actual_v < expect_v):
-            self.logger.throw(f"Device version do not match!"
-                              f"\n\texpect: {self.expect_version}"
-                              f"\n\tactual: {info.version}")
+        self._check_firmware(self.get_info())
+        _attach_cache[self._port] = self.info
 
     def set_devmode(self):
         self.request("devmode")
 
+    def stream(self, cmd: str, rate_hz: float, count: Optional[int] = None,
+               buffer_size: int = 16) -> Iterator[StreamSample]:
+        """
+        queries cmd at a fixed rate from a producer thread and yields timestamped results;
+        when the consumer does not keep up, the bounded buffer fills and the producer waits (backpressure).
+        The device must not be used for other requests until the generator is exhausted or closed.
+        """
+        stats = StreamStats(rate_hz)
+        self.stream_stats = stats
+        samples: queue.Queue = queue.Queue(buffer_size)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    samples.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def wait(delay: float) -> bool:
+            """False when the stream is stopped"""
+            if clock.get_clock().virtual:
+                clock.sleep(delay)
+                return not stop.is_set()
+            return not stop.wait(delay)
+
+        def producer_proc():
+            try:
+                period = 1 / rate_hz
+                next_time = clock.now()
+                n = 0
+                while count is None or n < count:
+                    delay = next_time - clock.now()
+                    if delay > 0 and not wait(delay):
+                        return
+                    time_query = clock.now()
+                    value = self.query(cmd, trace=False)
+                    time_done = clock.now()
+                    if time_done - time_query > period:
+                        stats.late += 1
+                    if not put(StreamSample(time_done, value)):
+                        return
+                    n += 1
+                    next_time += period
+                    if clock.now() - next_time > period:
+                        # more than a slot behind (overrun or consumer backpressure): skip, do not catch up
+                        next_time = clock.now()
+                put(None)
+            except Exception as e:
+                put(e)
+
+        producer = threading.Thread(target=producer_proc, name='stream')
+        producer.daemon = True
+        producer.start()
+
+        try:
+            while True:
+                item = samples.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                stats.count += 1
+                stats.time_last = item.timestamp
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+            self.logger.info(stats.summary_str())
+
 
 def test():
     device = EdproDevice()
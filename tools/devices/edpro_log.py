@@ -0,0 +1,117 @@
+import os
+import queue
+import threading
+import time
+from typing import Optional, TextIO, List, Tuple
+
+from tools.common.screen import Colors, scr_write
+
+QUEUE_SIZE = 10_000
+BATCH_SIZE = 256
+
+
+def format_device_line(tag: str, line: str, log_mode: bool) -> str:
+    color = Colors.GRAY
+
+    if log_mode:
+        if line.startswith('D '):
+            line = line[2:]
+            color = Colors.GRAY
+        if line.startswith('I '):
+            line = line[2:]
+            color = Colors.LIGHT_BLUE
+        if line.startswith('W '):
+            line = line[2:]
+            color = Colors.YELLOW
+        elif line.startswith('E '):
+            line = line[2:]
+            color = Colors.RED
+    else:
+        if line.startswith('W '):
+            color = Colors.YELLOW
+        elif line.startswith('E '):
+            color = Colors.RED
+
+    return f"[{tag}] {color}░ {line.strip()}{Colors.RESET}"
+
+
+class DeviceLogSink:
+    """
+    prints firmware log lines from a separate thread, so a slow console never blocks the serial reader:
+    lines are queued with timestamps, written in batches, lines that do not fit the queue are counted as dropped
+    """
+
+    def __init__(self, size: int = QUEUE_SIZE):
+        self.dropped: int = 0
+        self._reported_dropped: int = 0
+        self._queue: queue.Queue = queue.Queue(size)
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[TextIO] = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._writer_proc, name='device_log')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def set_file(self, path: Optional[str]):
+        """duplicates device lines (without colors) to a session log file"""
+        if self._file is not None:
+            self._file.close()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def put(self, tag: str, line: str, log_mode: bool = False):
+        if line == "":
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), tag, line, log_mode))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 1.0):
+        """waits (up to timeout) until queued lines are written"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks > 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def _write_batch(self, batch: List[Tuple[float, str, str, bool]]):
+        text = "".join(format_device_line(tag, line, log_mode) + "\n" for _, tag, line, log_mode in batch)
+        dropped = self.dropped
+        if dropped != self._reported_dropped:
+            text += f"{Colors.YELLOW}[device_log] {dropped - self._reported_dropped} lines dropped{Colors.RESET}\n"
+            self._reported_dropped = dropped
+        scr_write(text)
+
+        if self._file is not None:
+            for timestamp, tag, line, _ in batch:
+                stamp = time.strftime("%H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp % 1 * 1000):03}"
+                self._file.write(f"{stamp} [{tag}] {line}\n")
+            self._file.flush()
+
+    def _writer_proc(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                scr_write(f"[device_log] {e}\n")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+device_log = DeviceLogSink()
+
+# AMP_DEVICE_LOG=<path>: device lines of the session are appended to the file as well
+if os.environ.get("AMP_DEVICE_LOG"):
+    device_log.set_file(os.environ["AMP_DEVICE_LOG"])
@@ -1,7 +1,12 @@
-from typing import NamedTuple
+from typing import NamedTuple, Optional, Iterator
 
 from tools.common.logger import LoggedError
-from tools.devices.edpro_base import EdproDevice
+from tools.devices.edpro_async import AsyncEdproDevice
+from tools.devices.edpro_base import EdproDevice, ResponseSchema, ResponseField, StreamSample, BASE_SCHEMAS, \
+    to_value, to_flag
+
+MM_NAME = "Multimeter"
+MM_VERSION = "0.81"
 
 
 class MMValues(NamedTuple):
@@ -12,26 +17,56 @@ class MMValues(NamedTuple):
     value: float
 
 
+MM_SCHEMAS = {
+    **BASE_SCHEMAS,
+    "v": ResponseSchema(MMValues, [
+        ResponseField("mode", str),
+        ResponseField("rdiv", int),
+        ResponseField("gain", int),
+        ResponseField("finit", to_flag),
+        ResponseField("value", to_value),
+    ]),
+}
+
+
 class EdproMM(EdproDevice):
+    schemas = MM_SCHEMAS
 
     def __init__(self):
         super().__init__("mm")
-        self.expect_name = "Multimeter"
-        self.expect_version = "0.81"
+        self.expect_name = MM_NAME
+        self.expect_version = MM_VERSION
 
     def get_mode(self) -> str:
         response = self.request("mode")
         return response["mode"]
 
     def get_values(self) -> MMValues:
-        r = self.request("v")
-        if (r["value"] == "ovf"):
-            r["value"] = "inf"
-        return MMValues(mode=r["mode"],
-                        rdiv=int(r["rdiv"]),
-                        gain=int(r["gain"]),
-                        finit=r["finit"] == '1',
-                        value=float(r["value"]))
+        return self.query("v")
+
+    def get_value(self) -> float:
+        return self.get_values().value
+
+    def stream_values(self, rate_hz: float, count: Optional[int] = None,
+                      buffer_size: int = 16) -> Iterator[StreamSample]:
+        """yields StreamSample(timestamp, MMValues) at rate_hz, see EdproDevice.stream"""
+        return self.stream("v", rate_hz, count, buffer_size)
+
+
+class AsyncEdproMM(AsyncEdproDevice):
+    schemas = MM_SCHEMAS
+
+    def __init__(self):
+        super().__init__("mm")
+        self.expect_name = MM_NAME
+        self.expect_version = MM_VERSION
+
+    async def get_mode(self) -> str:
+        response = await self.request("mode")
+        return response["mode"]
+
+    async def get_values(self) -> MMValues:
+        return await self.query("v")
 
 
 def test():
@@ -43,6 +78,17 @@ def test():
     device.close()
 
 
+async def test_async():
+    device = AsyncEdproMM()
+    await device.connect()
+    try:
+        await device.wait_boot_complete()
+        await device.get_mode()
+        await device.get_values()
+    finally:
+        device.close()
+
+
 if __name__ == "__main__":
     try:
         test()
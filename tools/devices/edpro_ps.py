@@ -1,7 +1,11 @@
-from typing import NamedTuple
+from typing import NamedTuple, Optional, Iterator
 
 from tools.common.logger import LoggedError
-from tools.devices.edpro_base import EdproDevice
+from tools.devices.edpro_async import AsyncEdproDevice
+from tools.devices.edpro_base import EdproDevice, ResponseSchema, ResponseField, StreamSample, BASE_SCHEMAS
+
+PS_NAME = "Powersource"
+PS_VERSION = "0.8"
 
 
 class PSValues(NamedTuple):
@@ -9,29 +13,54 @@ class PSValues(NamedTuple):
     I: float
 
 
-class EdproPS(EdproDevice):
+PS_SCHEMAS = {
+    **BASE_SCHEMAS,
+    "v": ResponseSchema(PSValues, [
+        ResponseField("U", float),
+        ResponseField("I", float),
+    ], check_success=True),
+}
 
-    def __init__(self):
-        super().__init__("ps")
-        self.expect_name = "Powersource"
-        self.expect_version = "0.8"
 
-    def get_values(self) -> PSValues:
-        r = self.request("v")
-        if r.get("success") != "1":
-            self.logger.throw("Request not succeed!")
-        return PSValues(U=float(r["U"]),
-                        I=float(r["I"]))
+class PSCommands:
+    """commands of EdproPS and AsyncEdproPS, each returns what query()/cmd() returns"""
+
+    def get_values(self):
+        """PSValues, awaited on AsyncEdproPS"""
+        return self.query("v")
 
     def set_mode(self, mode: str):
-        self.cmd(f"mode {mode}")
+        return self.cmd(f"mode {mode}")
 
     def set_volt(self, v: float):
         level = int(round(v * 10))
-        self.cmd(f"set l {level}")
+        return self.cmd(f"set l {level}")
 
     def set_freq(self, f: int):
-        self.cmd(f"set f {f}")
+        return self.cmd(f"set f {f}")
+
+
+class EdproPS(PSCommands, EdproDevice):
+    schemas = PS_SCHEMAS
+
+    def __init__(self):
+        super().__init__("ps")
+        self.expect_name = PS_NAME
+        self.expect_version = PS_VERSION
+
+    def stream_values(self, rate_hz: float, count: Optional[int] = None,
+                      buffer_size: int = 16) -> Iterator[StreamSample]:
+        """yields StreamSample(timestamp, PSValues) at rate_hz, see EdproDevice.stream"""
+        return self.stream("v", rate_hz, count, buffer_size)
+
+
+class AsyncEdproPS(PSCommands, AsyncEdproDevice):
+    schemas = PS_SCHEMAS
+
+    def __init__(self):
+        super().__init__("ps")
+        self.expect_name = PS_NAME
+        self.expect_version = PS_VERSION
 
 
 def test():
@@ -44,6 +73,19 @@ def test():
     device.set_volt(1)
 
 
+async def test_async():
+    device = AsyncEdproPS()
+    await device.connect()
+    try:
+        await device.wait_boot_complete()
+        await device.set_devmode()
+        await device.get_values()
+        await device.set_mode("dc")
+        await device.set_volt(1)
+    finally:
+        device.close()
+
+
 if __name__ == "__main__":
     try:
         test()
@@ -1,9 +1,12 @@
+import math
+from array import array
+from bisect import bisect_left
 from enum import Enum
-from typing import Optional
-
-import usbtmc
+from functools import lru_cache
+from typing import Optional, NamedTuple, Dict, List, Tuple
 
 from tools.common.logger import LoggedError, Logger
+from tools.devices.scpi import ScpiInstrument, ScpiTransport, UsbtmcTransport
 
 logger = Logger("ri_meter")
 
@@ -42,8 +45,95 @@ class RigolMode(Enum):
     R_100M = ":MEASure:RESistance 6"
 
 
+# full scale of every range per function
+RANGES: Dict[str, List[Tuple[float, RigolMode]]] = {
+    "VDC": [(0.2, RigolMode.VDC_200m), (2, RigolMode.VDC_2), (20, RigolMode.VDC_20), (200, RigolMode.VDC_200)],
+    "VAC": [(0.2, RigolMode.VAC_200m), (2, RigolMode.VAC_2), (20, RigolMode.VAC_20), (200, RigolMode.VAC_200)],
+    "ADC": [(0.0002, RigolMode.ADC_200mkA), (0.002, RigolMode.ADC_2mA), (0.02, RigolMode.ADC_20mA),
+            (0.2, RigolMode.ADC_200mA), (2, RigolMode.ADC_2A), (10, RigolMode.ADC_10A)],
+    "AAC": [(0.02, RigolMode.AAC_20mA), (0.2, RigolMode.AAC_200mA), (2, RigolMode.AAC_2A), (10, RigolMode.AAC_10A)],
+    "R": [(200, RigolMode.R_200), (2e3, RigolMode.R_2K), (20e3, RigolMode.R_20K), (200e3, RigolMode.R_200K),
+          (2e6, RigolMode.R_2M), (10e6, RigolMode.R_10M), (100e6, RigolMode.R_100M)],
+    "FREQ": [(math.inf, RigolMode.FREQ_20)],
+}
+
+# expected value may use this part of the range full scale, the rest is left for the signal deviation
+RANGE_MARGIN = 0.5
+
+_RANGE_LIMITS: Dict[str, List[float]] = {
+    function: [full_scale * RANGE_MARGIN for full_scale, _ in ranges] for function, ranges in RANGES.items()
+}
+
+
+def select_range(function: str, expected_value: float) -> RigolMode:
+    """smallest range of the function which fits expected value with the margin, the largest one otherwise"""
+    ranges = RANGES[function]
+    index = bisect_left(_RANGE_LIMITS[function], abs(expected_value))
+    return ranges[min(index, len(ranges) - 1)][1]
+
+
+class RigolRate(Enum):
+    SLOW = "S"
+    MEDIUM = "M"
+    FAST = "F"
+
+
+# resolution of one reading relative to the range full scale, fastest rate first
+# (DM3058: 5½ digits at slow rate, 4½ digits at medium and fast rate, fast one is noisier)
+RATE_RESOLUTION: List[Tuple[RigolRate, float]] = [
+    (RigolRate.FAST, 3e-4),
+    (RigolRate.MEDIUM, 1e-4),
+    (RigolRate.SLOW, 1e-5),
+]
+
+_FULL_SCALE: Dict[RigolMode, float] = {mode: full_scale for ranges in RANGES.values() for full_scale, mode in ranges}
+
+
+@lru_cache(maxsize=None)
+def select_rate(mode: RigolMode, accuracy: float) -> Optional[RigolRate]:
+    """fastest reading rate which resolves accuracy (absolute) in the mode range, None for modes without rate"""
+    full_scale = _FULL_SCALE[mode]
+    if math.isinf(full_scale):
+        return None
+    for rate, resolution in RATE_RESOLUTION:
+        if resolution * full_scale <= accuracy:
+            return rate
+    return RigolRate.SLOW
+
+
+# worst case time of one reading, used for the bulk read timeout
+SAMPLE_TIMEOUT = 0.5
+
+
+class SampleStats(NamedTuple):
+    values: array
+    mean: float
+    stddev: float
+    min: float
+    max: float
+
+
+def sample_stats(values: array) -> SampleStats:
+    n = len(values)
+    mean = sum(values) / n
+    stddev = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1)) if n > 1 else 0.0
+    return SampleStats(values, mean, stddev, min(values), max(values))
+
+
+def mode_function(mode: RigolMode) -> str:
+    """SCPI function of a mode: RigolMode.VDC_20 -> 'VOLTage:DC'"""
+    return mode.value.split()[0][len(":MEASure:"):]
+
+
+# functions with a reading rate setting
+RATE_FUNCTIONS: List[str] = [mode_function(ranges[0][1]) for function, ranges in RANGES.items() if function != "FREQ"]
+
+# the meter keeps :RATE across sessions, it is set to this one on connect
+DEFAULT_RATE = RigolRate.SLOW
+
+
 # noinspection PyPep8Naming
-class RigolMeter:
+class RigolMeter(ScpiInstrument):
     """
     handles communication with RIGOL multimeter
     USB lib: https://github.com/python-ivi/python-usbtmc
@@ -51,94 +141,125 @@ class RigolMeter:
     RIGOL Docs: https://www.batronix.com/pdf/Rigol/ProgrammingGuide/DM3058_ProgrammingGuide_EN.pdf
     """
 
-    def __init__(self):
-        self._device: Optional[usbtmc.Instrument] = None
+    def __init__(self, transport: Optional[ScpiTransport] = None):
+        super().__init__(logger, transport)
         self._current_mode: Optional[RigolMode] = None
-
-    def connect(self):
-        logger.info("connect")
+        self._current_rate: Dict[str, RigolRate] = {}
+
+    def open_transport(self) -> ScpiTransport:
+        return UsbtmcTransport(0x1AB1, 0x09C4)
+
+    def on_connect(self):
+        self.ask("*IDN?")
+        self.write(";".join(f":RATE:{function} {DEFAULT_RATE.value}" for function in RATE_FUNCTIONS))
+        self._current_rate = {function: DEFAULT_RATE for function in RATE_FUNCTIONS}
+
+    @property
+    def mode(self) -> Optional[RigolMode]:
+        return self._current_mode
+
+    def set_mode(self, mode: RigolMode, rate: Optional[RigolRate] = None):
+        """
+        not sent again when the meter is already in this mode (range switching clicks relays and needs settling),
+        rate is set for the mode function when given
+        """
+        if mode != self._current_mode:
+            self._current_mode = mode
+            self.write(mode.value)
+        if rate is not None:
+            self.set_rate(rate)
+
+    def set_range(self, function: str, expected_value: float) -> RigolMode:
+        """function: VDC, VAC, ADC, AAC, R or FREQ"""
+        mode = select_range(function, expected_value)
+        self.set_mode(mode)
+        return mode
+
+    def set_rate(self, rate: RigolRate, function: Optional[str] = None):
+        """reading rate of the function (SCPI name, current mode function by default), not sent again when unchanged"""
+        if function is None:
+            if self._current_mode is None:
+                logger.throw("mode is not set: rate needs a function")
+            function = mode_function(self._current_mode)
+        if self._current_rate.get(function) == rate:
+            return
+        self._current_rate[function] = rate
+        self.write(f":RATE:{function} {rate.value}")
+
+    def set_accuracy(self, accuracy: float) -> Optional[RigolRate]:
+        """sets the fastest reading rate of the current mode which still meets accuracy (absolute, in mode units)"""
+        if self._current_mode is None:
+            logger.throw("mode is not set: accuracy needs a range")
+        rate = select_rate(self._current_mode, accuracy)
+        if rate is not None:
+            self.set_rate(rate)
+        return rate
+
+    def read_samples(self, n: int, rate: Optional[RigolRate] = None, discard: int = 0) -> SampleStats:
+        """
+        takes n readings of the current mode on one trigger (sample count) and fetches them in one transfer,
+        trigger source and sample count are restored afterwards;
+        first discard readings are dropped (e.g. stale reading after a change of the input)
+        """
+        if self._current_mode is None:
+            logger.throw("mode is not set")
+        if rate is not None:
+            self.set_rate(rate)
+
+        count = n + discard
+        trigger = self.ask(":TRIGger:SOURce?;:SAMPle:COUNt?")
+        source, _, sample_count = trigger.partition(";")
+        timeout = self.transport.timeout
+        self.transport.timeout = max(timeout, count * SAMPLE_TIMEOUT)
+        fetched = False
         try:
-            self._device = usbtmc.Instrument(0x1AB1, 0x09C4)
-        except Exception as e:
-            logger.throw(str(e))
-        self._ask("*IDN?")
-
-    def close(self):
-        logger.trace("disconnect")
-        if self._device:
-            self._device.close()
-
-    def _write(self, cmd: str):
-        logger.trace(f"<- {cmd}")
-        try:
-            self._device.write(cmd)
-        except Exception as e:
-            logger.throw(e)
-
-    def _ask(self, cmd: str) -> str:
-        logger.trace(f"<- {cmd}")
-        response = ""
-        try:
-            response = self._device.ask(cmd)
-            logger.trace(f"-> {response}")
-        except Exception as e:
-            logger.throw(e)
-
-        return response
-
-    def set_mode(self, mode: RigolMode):
-        self._current_mode = mode
-        self._write(mode.value)
+            self.write(f":TRIGger:SOURce IMMediate;:SAMPle:COUNt {count};:INITiate")
+            response = self.ask(":FETCh?", name=f":FETCh?*{count}")
+            fetched = True
+        finally:
+            self.transport.timeout = timeout
+            try:
+                self.write(f":SAMPle:COUNt {sample_count.strip()};:TRIGger:SOURce {source.strip()}")
+            except LoggedError:
+                # already logged, the error of the read is the one to report
+                if fetched:
+                    raise
+
+        values = array("d", (float(v) for v in response.split(",")[discard:]))
+        if len(values) != n:
+            logger.throw(f"invalid number of samples: {len(values)}, expected: {n}")
+        return sample_stats(values)
+
+    def _measure(self, function: str) -> float:
+        """reading of the function, the meter switches to it: a mode of another function is no longer current"""
+        mode = self._current_mode
+        if mode is not None and mode_function(mode) != function:
+            self._current_mode = None
+        return self.ask_float(f":MEASure:{function}?")
 
     def set_vdc_range(self, v: float):
-        if v <= 0.1:
-            mode = RigolMode.VDC_200m
-        elif v <= 1.0:
-            mode = RigolMode.VDC_2
-        elif v <= 10.0:
-            mode = RigolMode.VDC_20
-        else:
-            mode = RigolMode.VDC_200
-
-        if (mode != self._current_mode):
-            self.set_mode(mode)
+        self.set_range("VDC", v)
 
     def set_vac_range(self, v: float):
-        if v <= 0.1:
-            mode = RigolMode.VAC_200m
-        elif v <= 1.0:
-            mode = RigolMode.VAC_2
-        elif v <= 10.0:
-            mode = RigolMode.VAC_20
-        else:
-            mode = RigolMode.VAC_200
-
-        if (mode != self._current_mode):
-            self.set_mode(mode)
+        self.set_range("VAC", v)
 
     def measure_vdc(self) -> float:
-        response = self._ask(":MEASure:VOLTage:DC?")
-        return float(response)
+        return self._measure("VOLTage:DC")
 
     def measure_vac(self) -> float:
-        response = self._ask(":MEASure:VOLTage:AC?")
-        return float(response)
+        return self._measure("VOLTage:AC")
 
     def measure_adc(self) -> float:
-        response = self._ask(":MEASure:CURRent:DC?")
-        return float(response)
+        return self._measure("CURRent:DC")
 
     def measure_aac(self) -> float:
-        response = self._ask(":MEASure:CURRent:AC?")
-        return float(response)
+        return self._measure("CURRent:AC")
 
     def measure_freq(self) -> float:
-        response = self._ask(":MEASure:FREQuency?")
-        return float(response)
+        return self._measure("FREQuency")
 
     def measure_r(self) -> float:
-        response = self._ask(":MEASure:RESistance?")
-        return float(response)
+        return self._measure("RESistance")
 
 
 def test():
@@ -146,6 +267,8 @@ def test():
     device.connect()
     device.set_mode(RigolMode.VDC_20)
     device.measure_vdc()
+    stats = device.read_samples(10, RigolRate.FAST)
+    logger.info(f"mean: {stats.mean:0.6f} stddev: {stats.stddev:0.6f} min: {stats.min:0.6f} max: {stats.max:0.6f}")
 
 
 if __name__ == "__main__":
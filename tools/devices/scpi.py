@@ -0,0 +1,288 @@
+from collections import deque
+from typing import Optional, Callable, Deque, List, Any
+
+from tools.common import clock, timeline
+from tools.common.logger import Logger, LoggedError
+
+# raw USB bulk transport
+USB_READ_TIMEOUT = 5000
+USB_INTERFACE_NUM = 0
+USB_BUF_SIZE = 1024
+# pending input is read with this timeout (ms) until none is left
+USB_CLEAR_TIMEOUT = 50
+
+
+class ScpiTransport:
+    """moves SCPI messages to an instrument and back, all errors are raised as is"""
+
+    timeout: float = 5.0
+
+    def write(self, cmd: str):
+        raise NotImplementedError
+
+    def read(self) -> str:
+        raise NotImplementedError
+
+    def ask(self, cmd: str) -> str:
+        self.write(cmd)
+        return self.read()
+
+    def clear(self):
+        """discards pending input, e.g. a late response to a timed out query"""
+        pass
+
+    def close(self):
+        pass
+
+
+class UsbtmcTransport(ScpiTransport):
+    """USB TMC class device through python-usbtmc"""
+
+    def __init__(self, vid: int, pid: int):
+        import usbtmc
+        self._device = usbtmc.Instrument(vid, pid)
+
+    @property
+    def timeout(self) -> float:
+        return self._device.timeout
+
+    @timeout.setter
+    def timeout(self, value: float):
+        self._device.timeout = value
+
+    def write(self, cmd: str):
+        self._device.write(cmd)
+
+    def read(self) -> str:
+        return self._device.read()
+
+    def ask(self, cmd: str) -> str:
+        return self._device.ask(cmd)
+
+    def clear(self):
+        self._device.clear()
+
+    def close(self):
+        self._device.close()
+
+
+_resource_manager: Any = None
+
+
+class VisaTransport(ScpiTransport):
+    """VISA resource through pyvisa, resource manager is created on the first use"""
+
+    def __init__(self, resource: str):
+        global _resource_manager
+        import pyvisa
+        if _resource_manager is None:
+            _resource_manager = pyvisa.ResourceManager()
+        self._device = _resource_manager.open_resource(resource)
+
+    @property
+    def timeout(self) -> float:
+        return self._device.timeout / 1000
+
+    @timeout.setter
+    def timeout(self, value: float):
+        self._device.timeout = value * 1000
+
+    def write(self, cmd: str):
+        self._device.write(cmd)
+
+    def read(self) -> str:
+        return self._device.read()
+
+    def ask(self, cmd: str) -> str:
+        return self._device.query(cmd)
+
+    def clear(self):
+        self._device.clear()
+
+    def close(self):
+        self._device.close()
+
+
+class UsbBulkTransport(ScpiTransport):
+    """raw USB bulk endpoints through pyusb (OWON instruments), device is matched by VID, PID and serial prefix"""
+
+    def __init__(self, vid: int, pid: int, serial_prefix: str, name: str, logger: Logger):
+        import usb.core
+        import usb.util
+        self._usb_core = usb.core
+        self._usb_util = usb.util
+
+        # noinspection PyBroadException
+        def matcher(it):
+            # it.serial_number fail on Windows if GoogleChrome has been launched
+            try:
+                return it.idVendor == vid \
+                       and it.idProduct == pid \
+                       and it.serial_number.startswith(serial_prefix)
+            except Exception as e:
+                logger.trace(e)
+                return False
+
+        found_list = list(usb.core.find(find_all=True, custom_match=matcher))
+
+        for d in found_list:
+            logger.trace("found: %s %s %s", d.manufacturer, d.product, d.serial_number)
+
+        if len(found_list) == 0:
+            logger.throw(f"Cannot find device: {name}")
+        elif len(found_list) > 1:
+            logger.throw("Too much devices found!")
+
+        device = found_list[0]
+        usb.util.claim_interface(device, USB_INTERFACE_NUM)
+        device.set_configuration()
+        intf = device.get_active_configuration()[(0, 0)]
+        self._device = device
+        self._reader = self._find_endpoint(intf, usb.util.ENDPOINT_IN)
+        self._writer = self._find_endpoint(intf, usb.util.ENDPOINT_OUT)
+        self.timeout = USB_READ_TIMEOUT / 1000
+
+    def _find_endpoint(self, interface, direction):
+        return self._usb_util.find_descriptor(
+            interface,
+            custom_match=lambda e: self._usb_util.endpoint_direction(e.bEndpointAddress) == direction
+        )
+
+    def write(self, cmd: str):
+        self._writer.write(cmd.encode())
+
+    def read(self) -> str:
+        text = self._reader.read(USB_BUF_SIZE, round(self.timeout * 1000)).tobytes().decode()
+        # OWON generator ends responses with a prompt
+        if text.endswith("->\n"):
+            return text[0:-4]
+        if text.endswith("\n"):
+            return text[0:-1]
+        return text
+
+    def clear(self):
+        try:
+            while True:
+                self._reader.read(USB_BUF_SIZE, USB_CLEAR_TIMEOUT)
+        except self._usb_core.USBTimeoutError:
+            pass
+
+    def close(self):
+        self._usb_util.release_interface(self._device, USB_INTERFACE_NUM)
+
+
+class MockTransport(ScpiTransport):
+    """
+    in-memory instrument: handler gets every command and returns the response of a query,
+    or None for commands without response
+    """
+
+    def __init__(self, handler: Callable[[str], Optional[str]]):
+        self.handler = handler
+        self.commands: List[str] = []
+        self._responses: Deque[str] = deque()
+
+    def write(self, cmd: str):
+        self.commands.append(cmd)
+        response = self.handler(cmd)
+        if response is not None:
+            self._responses.append(response)
+
+    def read(self) -> str:
+        if not self._responses:
+            raise TimeoutError("no response")
+        return self._responses.popleft()
+
+    def clear(self):
+        self._responses.clear()
+
+
+class ScpiInstrument:
+    """
+    common SCPI instrument: connection, command timing (timeline), retries of failed '?' queries,
+    response parsing and tracing; subclasses open their transport in open_transport()
+    """
+
+    def __init__(self, logger: Logger, transport: Optional[ScpiTransport] = None, retries: int = 1):
+        self.logger = logger
+        self.transport: Optional[ScpiTransport] = transport
+        # given transport (e.g. mock) is kept over close/connect, opened one is reopened
+        self._keep_transport = transport is not None
+        # failed '?' queries are repeated this number of times, commands sent with ask() are not (not idempotent)
+        self.retries = retries
+
+    def open_transport(self) -> ScpiTransport:
+        raise NotImplementedError
+
+    def on_connect(self):
+        pass
+
+    def connect(self):
+        self.logger.info("connect")
+        if self.transport is None:
+            try:
+                self.transport = self.open_transport()
+            except LoggedError:
+                raise
+            except Exception as e:
+                self.logger.throw(str(e))
+        self.on_connect()
+
+    def close(self):
+        self.logger.trace("disconnect")
+        if self.transport is not None:
+            self.transport.close()
+            if not self._keep_transport:
+                self.transport = None
+
+    def write(self, cmd: str):
+        self.logger.trace("<- %s", cmd)
+        time_start = clock.now()
+        try:
+            self.transport.write(cmd)
+        except Exception as e:
+            self.logger.throw(e)
+        timeline.record(self.logger.tag, cmd, time_start)
+
+    def read(self) -> str:
+        time_start = clock.now()
+        try:
+            response = self.transport.read()
+        except Exception as e:
+            self.logger.throw(e)
+        timeline.record(self.logger.tag, "read", time_start)
+        self.logger.trace("-> %s", response)
+        return response
+
+    def ask(self, cmd: str, name: Optional[str] = None) -> str:
+        """query with response, name groups the command in the timeline when cmd is long or variable"""
+        self.logger.trace("<- %s", cmd)
+        attempt = 0
+        while True:
+            time_start = clock.now()
+            try:
+                response = self.transport.ask(cmd)
+                break
+            except Exception as e:
+                if attempt >= self.retries or "?" not in cmd:
+                    self.logger.throw(e)
+                attempt += 1
+                self.logger.warn("%s, retry %d: %s", e, attempt, cmd)
+                self._clear_input()
+        timeline.record(self.logger.tag, name or cmd, time_start)
+        self.logger.trace("-> %s", response)
+        return response
+
+    def _clear_input(self):
+        """a late response to the failed query would be taken as the response to the retry"""
+        try:
+            self.transport.clear()
+        except Exception as e:
+            self.logger.trace(e)
+
+    def ask_float(self, cmd: str) -> float:
+        response = self.ask(cmd)
+        try:
+            return float(response)
+        except ValueError:
+            self.logger.throw(f"invalid response: '{cmd}' -> '{response}'")
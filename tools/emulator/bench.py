@@ -0,0 +1,374 @@
+"""
+simulated test bench: reference instruments (RigolMeter, OwonPower, OwonGenerator, RigolLoad) on MockTransport
+and a physical model of devboard routes shared with the firmware emulators of the DUTs
+"""
+import math
+import random
+import threading
+from typing import Dict, List, Optional, Callable, Tuple
+
+from tools.common.clock import now as clock_now
+from tools.devices.scpi import MockTransport
+from tools.emulator.edpro_emulator import FirmwareModel, MultimeterModel, PowersourceModel, DevboardModel, \
+    model_listeners
+
+# devboard resistors selected by mm_rsel/meas_r n, ohm
+RESISTORS: Dict[int, float] = {1: 10, 2: 2_000, 3: 20_000, 4: 200_000, 5: 1_800_000,
+                               6: 10, 7: 2_000, 8: 20_000, 9: 200_000, 10: 1_800_000}
+# resistance seen by the powersource output on pp_load n, ohm (2: 4.7 ohm load + 1 ohm source resistance)
+PP_LOADS: Dict[int, float] = {0: 0.05, 1: 10, 2: 5.7}
+# mm_igen current path: generator amplitude (Vpp) / IGEN_R = current (rms), 25 Vpp -> 0.165 A
+IGEN_R = 25 / 0.165
+# reading of an overloaded reference meter input
+METER_OVERLOAD = 9.9e37
+
+# DUT ports of the simulated bench
+SIM_PORTS = {
+    "mm": "amp://multimeter?log=0",
+    "ps": "amp://powersource?log=0",
+    "db": "amp://devboard?log=0",
+}
+
+DEFAULT_SETTLE_TAU = 0.02
+DEFAULT_NOISE_ABS = 1e-6
+DEFAULT_NOISE_REL = 1e-5
+
+METER_FUNCTIONS = {
+    "VOLTage:DC": "VDC",
+    "VOLTage:AC": "VAC",
+    "CURRent:DC": "ADC",
+    "CURRent:AC": "AAC",
+    "RESistance": "R",
+    "FREQuency": "FREQ",
+}
+# :RATE and :TRIGger:SOURce parameters as RigolMeter writes them
+METER_RATES = ["S", "M", "F"]
+METER_TRIGGERS = ["IMMediate", "BUS", "EXTernal"]
+DUT_MODES = ["VDC", "VAC", "ADC", "AAC", "R"]
+
+
+class Settling:
+    """
+    first order response to steps of the target value, time constant tau;
+    log_scale settles the logarithm of the value (resistance steps span decades)
+    """
+
+    def __init__(self, tau: float, clock: Callable[[], float], log_scale: bool = False):
+        self.tau = tau
+        self.clock = clock
+        self.log_scale = log_scale
+        self._from = 0.0
+        self._target = 0.0
+        self._time_step = clock()
+
+    def _value(self, now: float) -> float:
+        if self.tau <= 0 or not math.isfinite(self._from) or not math.isfinite(self._target):
+            return self._target
+        decay = math.exp(-(now - self._time_step) / self.tau)
+        if self.log_scale and self._from > 0 and self._target > 0:
+            return self._target * (self._from / self._target) ** decay
+        return self._target + (self._from - self._target) * decay
+
+    def update(self, target: float) -> float:
+        now = self.clock()
+        if target != self._target:
+            self._from = self._value(now)
+            self._target = target
+            self._time_step = now
+        return self._value(now)
+
+
+def parallel(resistors: List[float]) -> float:
+    return 1 / sum(1 / r for r in resistors) if resistors else math.inf
+
+
+class BenchModel:
+    """
+    what every input sees through the selected devboard route: the reference meter and the DUT multimeter
+    follow the sources with settle time constant and reading noise
+    """
+
+    def __init__(self,
+                 settle_tau: float = DEFAULT_SETTLE_TAU,
+                 noise_abs: float = DEFAULT_NOISE_ABS,
+                 noise_rel: float = DEFAULT_NOISE_REL,
+                 seed: Optional[int] = None,
+                 clock: Callable[[], float] = clock_now):
+        self.settle_tau = settle_tau
+        self.noise_abs = noise_abs
+        self.noise_rel = noise_rel
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._settling: Dict[str, Settling] = {}
+
+        self.power_volt = 0.0
+        self.power_current = 0.0
+        self.meter_function = "VDC"
+        self.meter_trigger = "IMMediate"
+        self.meter_rate: Dict[str, str] = {}
+        self.meter_sample_count = 1
+        self._meter_samples: List[str] = []
+        self.gen_amp = 0.0
+        self.gen_freq = 1000
+        self.gen_on = False
+        self.load_on = False
+        self.load_current = 0.0
+        self.battery_volt = 4.0
+        self.battery_r = 0.05
+
+        # DUT models, attached when their emulators are created
+        self.mm: Optional[MultimeterModel] = None
+        self.ps: Optional[PowersourceModel] = None
+        self.db: Optional[DevboardModel] = None
+        model_listeners.append(self._attach)
+
+    def close(self):
+        model_listeners.remove(self._attach)
+
+    def _attach(self, name: str, model: FirmwareModel):
+        with self._lock:
+            if isinstance(model, MultimeterModel):
+                self.mm = model
+                model.source = self.dut_input
+            elif isinstance(model, PowersourceModel):
+                self.ps = model
+                model.load = self.ps_load
+            elif isinstance(model, DevboardModel):
+                self.db = model
+            model.on_change = self.changed
+
+    # sources
+
+    def route(self) -> Tuple[str, List[int]]:
+        if self.db is None:
+            return "off", []
+        return self.db.route, [int(arg) for arg in self.db.route_args if arg.isdigit()]
+
+    def ps_load(self) -> float:
+        route, args = self.route()
+        if route == "pp_load" and args:
+            return PP_LOADS.get(args[0], math.inf)
+        return math.inf
+
+    def _ps_output(self, mode: str) -> Tuple[float, float]:
+        """powersource DUT output voltage and current in the given mode, zero in the other one"""
+        if self.ps is None or self.ps.mode != mode:
+            return 0.0, 0.0
+        return self.ps.voltage(), self.ps.current()
+
+    def _gen_rms(self) -> float:
+        return self.gen_amp / 2.0 / math.sqrt(2) if self.gen_on else 0.0
+
+    def _power_current(self) -> float:
+        # current path has low resistance, the supply works in constant current mode
+        return self.power_current if self.power_volt > 0 else 0.0
+
+    def meter_target(self, function: str) -> float:
+        """ideal value at the reference meter input"""
+        route, args = self.route()
+        ps_route = route in ("meas_v", "meas_i", "pp_load")
+        if function == "VDC":
+            if route == "mm_vpow":
+                return self.power_volt
+            if route == "mm_vpow_rev":
+                return -self.power_volt
+            return self._ps_output("dc")[0] if ps_route else 0.0
+        if function == "VAC":
+            if route == "mm_vgen":
+                return self._gen_rms()
+            return self._ps_output("ac")[0] if ps_route else 0.0
+        if function == "ADC":
+            if route in ("mm_ipow", "mm_ipow2"):
+                return self._power_current()
+            if route == "mm_ipow_rev":
+                return -self._power_current()
+            return -self._ps_output("dc")[1] if route == "pp_load" else 0.0
+        if function == "AAC":
+            if route == "mm_igen":
+                return self.gen_amp / IGEN_R if self.gen_on else 0.0
+            return self._ps_output("ac")[1] if route == "pp_load" else 0.0
+        if function == "R":
+            return parallel([RESISTORS[n] for n in args]) if route == "meas_r" else math.inf
+        if function == "FREQ":
+            if route == "mm_vgen" and self.gen_on:
+                return self.gen_freq
+            return self.ps.freq if ps_route and self._ps_output("ac")[0] > 0 else 0.0
+        return 0.0
+
+    def dut_target(self, mode: str) -> float:
+        """ideal value at the DUT multimeter input"""
+        route, args = self.route()
+        if mode == "VDC":
+            return {"mm_vpow": self.power_volt, "mm_vpow_rev": -self.power_volt}.get(route, 0.0)
+        if mode == "VAC":
+            return self._gen_rms() if route == "mm_vgen" else 0.0
+        if mode == "ADC":
+            current = self._power_current()
+            return {"mm_ipow": current, "mm_ipow2": current, "mm_ipow_rev": -current}.get(route, 0.0)
+        if mode == "AAC":
+            return self.gen_amp / IGEN_R if route == "mm_igen" and self.gen_on else 0.0
+        if mode == "R":
+            if route == "mm_rgnd":
+                return 0.0
+            return parallel([RESISTORS[n] for n in args]) if route == "mm_rsel" else math.inf
+        return 0.0
+
+    # readings
+
+    def _settled(self, key: str, target: float) -> float:
+        settling = self._settling.get(key)
+        if settling is None:
+            settling = self._settling[key] = Settling(self.settle_tau, self.clock, log_scale=key.endswith(" R"))
+        return settling.update(target)
+
+    def _noisy(self, value: float) -> float:
+        if not math.isfinite(value):
+            return value
+        return value + self._random.gauss(0, self.noise_abs + self.noise_rel * abs(value))
+
+    def changed(self):
+        """starts settling of every input at the time a source or route is changed"""
+        with self._lock:
+            for function in METER_FUNCTIONS.values():
+                self._settled(f"meter {function}", self.meter_target(function))
+            for mode in DUT_MODES:
+                self._settled(f"dut {mode}", self.dut_target(mode))
+
+    def meter_value(self, function: str) -> float:
+        with self._lock:
+            return self._noisy(self._settled(f"meter {function}", self.meter_target(function)))
+
+    def dut_input(self, mode: str) -> float:
+        with self._lock:
+            return self._noisy(self._settled(f"dut {mode}", self.dut_target(mode)))
+
+    # reference instruments
+
+    def _meter_reading(self, function: str) -> str:
+        value = self.meter_value(function)
+        return f"{value if math.isfinite(value) else METER_OVERLOAD:.7E}"
+
+    def _meter_command(self, cmd: str) -> Optional[str]:
+        """commands of RigolMeter only, anything else is an error: wrong SCPI must fail the simulated run"""
+        args = cmd.split()
+        if not args:
+            raise ValueError(f"meter: empty command in '{cmd}'")
+        header, params = args[0], args[1:]
+        if cmd == "*IDN?":
+            return "Rigol Technologies,DM3058,SIM,1.0"
+        if header.startswith(":MEASure:") and header.rstrip("?")[len(":MEASure:"):] in METER_FUNCTIONS:
+            function = METER_FUNCTIONS[header.rstrip("?")[len(":MEASure:"):]]
+            if header.endswith("?") and not params:
+                return self._meter_reading(function)
+            if not header.endswith("?") and len(params) == 1 and params[0].isdigit():
+                self.meter_function = function
+                return None
+        elif header.startswith(":RATE:") and header[len(":RATE:"):] in METER_FUNCTIONS and header != ":RATE:FREQuency":
+            if len(params) == 1 and params[0] in METER_RATES:
+                self.meter_rate[METER_FUNCTIONS[header[len(":RATE:"):]]] = params[0]
+                return None
+        elif cmd == ":TRIGger:SOURce?":
+            return self.meter_trigger
+        elif cmd == ":SAMPle:COUNt?":
+            return str(self.meter_sample_count)
+        elif header == ":TRIGger:SOURce" and len(params) == 1 and params[0] in METER_TRIGGERS:
+            self.meter_trigger = params[0]
+            return None
+        elif header == ":SAMPle:COUNt" and len(params) == 1 and params[0].isdigit() and int(params[0]) > 0:
+            self.meter_sample_count = int(params[0])
+            return None
+        elif cmd == ":INITiate":
+            self._meter_samples = [self._meter_reading(self.meter_function) for _ in range(self.meter_sample_count)]
+            return None
+        elif cmd == ":FETCh?":
+            return ",".join(self._meter_samples)
+        raise ValueError(f"meter: unknown command '{cmd}'")
+
+    def handle_meter(self, cmd: str) -> Optional[str]:
+        """compound commands (';') are handled one by one, responses of the queries are joined back"""
+        responses = [self._meter_command(part.strip()) for part in cmd.split(";")]
+        responses = [response for response in responses if response is not None]
+        return ";".join(responses) if responses else None
+
+    def handle_power(self, cmd: str) -> Optional[str]:
+        args = cmd.split()
+        if cmd == "*IDN?":
+            return "OWON,ODP3031,SIM,1.0"
+        if cmd == ":MEAS:VOLT:CHAN1":
+            return f"{self.power_volt:0.3f}"
+        if args[0] == ":VOLT:OUT:IND1":
+            self.power_volt = float(args[1])
+        elif args[0] == ":CURR:OUT:IND1":
+            self.power_current = float(args[1])
+        self.changed()
+        return None
+
+    def handle_generator(self, cmd: str) -> Optional[str]:
+        args = cmd.split()
+        if cmd == "*IDN?":
+            return "OWON,AG051,SIM,1.0"
+        if cmd == ":FUNCtion:SINE:LOAD?":
+            return "OFF"
+        if args[0] == ":FUNC:SINE:FREQ":
+            self.gen_freq = float(args[1])
+        elif args[0] == ":FUNC:SINE:AMPL":
+            self.gen_amp = float(args[1])
+        elif args[0] == ":CHANnel:CH1":
+            self.gen_on = args[1] == "ON"
+        elif cmd == "*RST":
+            self.gen_on = False
+        else:
+            return "NULL"
+        self.changed()
+        return "OK"
+
+    def handle_load(self, cmd: str) -> Optional[str]:
+        args = cmd.split()
+        current = self.load_current if self.load_on else 0.0
+        if cmd == "*IDN?":
+            return "RIGOL TECHNOLOGIES,DL3021,SIM,1.0"
+        if cmd == ":MEASure:VOLTage?":
+            return f"{self.battery_volt - current * self.battery_r:0.4f}"
+        if cmd in (":MEASure:CURRent?", ":MEASure:CURRent:MAX?"):
+            return f"{current:0.4f}"
+        if cmd == ":SOURce:FUNCtion?":
+            return "CC"
+        if cmd == ":SYSTem:ERRor?":
+            return '0,"No error"'
+        if args[0] == ":SOURce:CURRent":
+            self.load_current = float(args[1])
+        elif args[0] == ":SOURce:INPut":
+            self.load_on = args[1] in ("1", "ON")
+        elif cmd == "*RST":
+            self.load_on = False
+        return None
+
+    def transport(self, instrument: str) -> MockTransport:
+        """instrument: meter, power, generator or load"""
+        handlers = {
+            "meter": self.handle_meter,
+            "power": self.handle_power,
+            "generator": self.handle_generator,
+            "load": self.handle_load,
+        }
+        handler = handlers[instrument]
+
+        def locked_handler(cmd: str) -> Optional[str]:
+            with self._lock:
+                return handler(cmd)
+
+        return MockTransport(locked_handler)
+
+
+_bench: Optional[BenchModel] = None
+_bench_lock = threading.Lock()
+
+
+def sim_bench() -> BenchModel:
+    """bench shared by all simulated instruments of the process"""
+    global _bench
+    with _bench_lock:
+        if _bench is None:
+            _bench = BenchModel()
+        return _bench
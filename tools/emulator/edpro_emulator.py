@@ -0,0 +1,354 @@
+import math
+import os
+import random
+import select
+import sys
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Optional, Callable, Deque, Tuple, Type
+
+from tools.common import clock
+from tools.common.logger import Logger
+
+logger = Logger("emulator")
+
+DEFAULT_LATENCY = 0.003
+DEFAULT_JITTER = 0.001
+DEFAULT_BOOT_TIME = 0.05
+# hangup poll interval of serve_pty while no client has the port open
+PTY_IDLE_INTERVAL = 0.05
+
+
+def ok(**fields) -> str:
+    return ": " + " ".join(f"{k}={v}" for k, v in dict(success=1, **fields).items())
+
+
+def fail() -> str:
+    return ": success=0"
+
+
+class FirmwareModel:
+    """line protocol of amperia firmware, handle() returns log lines followed by the ':' response line"""
+
+    name = "noname"
+    version = "0.1"
+
+    def __init__(self):
+        self.devmode = False
+        # called after every handled device command, attached by simulators
+        self.on_change: Optional[Callable[[], None]] = None
+
+    def boot_lines(self) -> List[str]:
+        return [f"I {self.name} v{self.version}",
+                "D wifi: off",
+                ": init=1"]
+
+    def handle(self, cmd: str) -> List[str]:
+        args = cmd.split()
+        if len(args) == 0:
+            return []
+        if args[0] == "i":
+            return [ok(name=self.name, version=self.version)]
+        if args[0] == "devmode":
+            self.devmode = True
+            return ["I devmode: on", ok()]
+        if args == ["conf", "s"]:
+            return ["I config saved", ok()]
+        lines = self.on_command(args)
+        if lines is None:
+            return [f"E unknown command: '{cmd}'", fail()]
+        if self.on_change is not None:
+            self.on_change()
+        return lines
+
+    def on_command(self, args: List[str]) -> Optional[List[str]]:
+        return None
+
+
+class MultimeterModel(FirmwareModel):
+    name = "Multimeter"
+    version = "0.81"
+
+    MODES = ["VDC", "VAC", "ADC", "AAC", "R"]
+
+    def __init__(self):
+        super().__init__()
+        self.mode = "VDC"
+        self.cal: List[str] = []
+        # returns the quantity applied to the inputs for the given mode, attached by simulators
+        self.source: Optional[Callable[[str], float]] = None
+
+    def measure(self) -> float:
+        if self.source is not None:
+            return self.source(self.mode)
+        return math.inf if self.mode == "R" else 0.0
+
+    def on_command(self, args: List[str]) -> Optional[List[str]]:
+        if args == ["mode"]:
+            return [ok(mode=self.mode)]
+        if args[0] == "mode" and len(args) == 2:
+            mode = args[1].upper()
+            if mode not in self.MODES:
+                return [f"W invalid mode: {args[1]}", fail()]
+            self.mode = mode
+            return [f"D mode: {mode}", ok()]
+        if args == ["v"]:
+            value = self.measure()
+            finit = math.isfinite(value)
+            return [ok(mode=self.mode, rdiv=0, gain=1, finit=int(finit),
+                       value=f"{value:0.6f}" if finit else "ovf")]
+        if args[0] == "cal" and len(args) >= 2:
+            self.cal.append(" ".join(args[1:]))
+            return [f"I cal {' '.join(args[1:])}", ok()]
+        return None
+
+
+class PowersourceModel(FirmwareModel):
+    name = "Powersource"
+    version = "0.8"
+
+    def __init__(self):
+        super().__init__()
+        self.mode = "dc"
+        self.level = 0
+        self.freq = 1000
+        self.cal: List[str] = []
+        # returns load resistance connected to the output, attached by simulators
+        self.load: Optional[Callable[[], float]] = None
+
+    def voltage(self) -> float:
+        return self.level / 10
+
+    def current(self) -> float:
+        r = self.load() if self.load is not None else math.inf
+        return self.voltage() / r if r > 0 else 0.0
+
+    def on_command(self, args: List[str]) -> Optional[List[str]]:
+        if args[0] == "mode" and len(args) == 2 and args[1] in ("dc", "ac"):
+            self.mode = args[1]
+            return [f"D mode: {self.mode}", ok()]
+        if args[0] == "set" and len(args) == 3:
+            if args[1] == "l":
+                self.level = int(args[2])
+                return [f"D level: {self.level}", ok()]
+            if args[1] == "f":
+                self.freq = int(args[2])
+                return [f"D freq: {self.freq}", ok()]
+        if args == ["v"]:
+            return [ok(U=f"{self.voltage():0.4f}", I=f"{self.current():0.4f}")]
+        if args[0] == "cal" and len(args) >= 2:
+            self.cal.append(" ".join(args[1:]))
+            return [f"I cal {' '.join(args[1:])}", ok()]
+        return None
+
+
+class DevboardModel(FirmwareModel):
+    name = "Devboard"
+    version = "0.1"
+
+    ROUTES = ["off", "mm_vgen", "mm_vpow", "mm_vpow_rev", "mm_vgnd", "mm_igen", "mm_ipow", "mm_ipow2",
+              "mm_ipow_rev", "mm_rgnd", "mm_rsel", "pp_load", "meas_v", "meas_i", "meas_r"]
+
+    def __init__(self):
+        super().__init__()
+        self.route = "off"
+        self.route_args: List[str] = []
+
+    def on_command(self, args: List[str]) -> Optional[List[str]]:
+        if args[0] == "set" and len(args) >= 2 and args[1] in self.ROUTES:
+            self.route = args[1]
+            self.route_args = args[2:]
+            return [f"D route: {' '.join(args[1:])}", ok()]
+        return None
+
+
+MODELS: Dict[str, Type[FirmwareModel]] = {
+    "multimeter": MultimeterModel,
+    "powersource": PowersourceModel,
+    "devboard": DevboardModel,
+}
+
+
+class FirmwareEmulator:
+    """
+    byte level device emulation: incoming bytes are split into commands,
+    output lines become readable after the configured latency (+ random jitter), in order
+    """
+
+    def __init__(self, model: FirmwareModel,
+                 latency: float = DEFAULT_LATENCY,
+                 jitter: float = DEFAULT_JITTER,
+                 boot_time: float = DEFAULT_BOOT_TIME,
+                 debug_log: bool = True):
+        self.model = model
+        self.latency = latency
+        self.jitter = jitter
+        self.boot_time = boot_time
+        self.debug_log = debug_log
+        self.commands: int = 0
+        self._rx = bytearray()
+        self._tx: Deque[Tuple[float, bytes]] = deque()
+        self._last_ready: float = 0
+        self._cond = threading.Condition()
+        self._read_cancelled = False
+
+    def _schedule(self, lines: List[str], delay: float):
+        if not self.debug_log:
+            lines = [line for line in lines if not line.startswith("D ")]
+        if len(lines) == 0:
+            return
+        ready = max(clock.now() + delay, self._last_ready)
+        self._last_ready = ready
+        self._tx.append((ready, "".join(line + "\r\n" for line in lines).encode()))
+        self._cond.notify_all()
+
+    def reset(self):
+        with self._cond:
+            self._rx.clear()
+            self._tx.clear()
+            self._last_ready = 0
+            self._schedule(self.model.boot_lines(), self.boot_time)
+
+    def drop_output(self):
+        """discards pending output lines (nobody is listening)"""
+        with self._cond:
+            self._tx.clear()
+            self._last_ready = 0
+
+    def write(self, data: bytes):
+        with self._cond:
+            self._rx += data
+            while True:
+                pos = self._rx.find(b"\n")
+                if pos < 0:
+                    break
+                cmd = self._rx[:pos].decode(errors="replace").strip()
+                del self._rx[:pos + 1]
+                if cmd == "":
+                    continue
+                self.commands += 1
+                delay = self.latency + random.uniform(0, self.jitter)
+                self._schedule(self.model.handle(cmd), delay)
+
+    def in_waiting(self) -> int:
+        now = clock.now()
+        with self._cond:
+            return sum(len(data) for ready, data in self._tx if ready <= now)
+
+    def next_ready(self) -> Optional[float]:
+        with self._cond:
+            return self._tx[0][0] if self._tx else None
+
+    def read(self, size: int, timeout: Optional[float]) -> bytes:
+        """returns up to size ready bytes, waits for the first ones up to timeout (None - forever)"""
+        deadline = None if timeout is None else clock.now() + timeout
+        with self._cond:
+            while True:
+                if self._read_cancelled:
+                    self._read_cancelled = False
+                    return b""
+                now = clock.now()
+                if self._tx and self._tx[0][0] <= now:
+                    break
+                if self._tx and clock.get_clock().virtual:
+                    # latency of the response passes in virtual time
+                    clock.sleep(self._tx[0][0] - now)
+                    continue
+                wait = None if deadline is None else deadline - now
+                if self._tx:
+                    ready_wait = self._tx[0][0] - now
+                    wait = ready_wait if wait is None else min(wait, ready_wait)
+                if wait is not None and wait <= 0:
+                    return b""
+                self._cond.wait(wait)
+
+            result = bytearray()
+            while self._tx and self._tx[0][0] <= now and len(result) < size:
+                ready, data = self._tx.popleft()
+                take = size - len(result)
+                result += data[:take]
+                if take < len(data):
+                    self._tx.appendleft((ready, data[take:]))
+            return bytes(result)
+
+    def cancel_read(self):
+        """pending (or next) read returns at once"""
+        with self._cond:
+            self._read_cancelled = True
+            self._cond.notify_all()
+
+
+# called with (model_name, model) for every created emulator, simulators attach their hooks here
+model_listeners: List[Callable[[str, FirmwareModel], None]] = []
+
+
+def create_emulator(model_name: str, **options) -> FirmwareEmulator:
+    if model_name not in MODELS:
+        raise ValueError(f"unknown device model: '{model_name}', expected one of {list(MODELS)}")
+    model = MODELS[model_name]()
+    for listener in model_listeners:
+        listener(model_name, model)
+    return FirmwareEmulator(model, **options)
+
+
+def serve_pty(emulator: FirmwareEmulator) -> str:
+    """
+    serves the emulator on a pseudo terminal (POSIX only) from a daemon thread,
+    returns slave device path to be used as serial port.
+    A pseudo terminal has no modem control lines, the device can not be reset by the client and keeps running;
+    its output is dropped while no client has the port open, as on a real UART
+    """
+    import pty
+    master, slave = pty.openpty()
+    import tty
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    # the master reports hangup until a client opens the slave side
+    os.close(slave)
+    poller = select.poll()
+    poller.register(master, select.POLLIN)
+
+    def serve_proc():
+        while True:
+            next_ready = emulator.next_ready()
+            timeout = PTY_IDLE_INTERVAL if next_ready is None else max(0.0, next_ready - clock.now())
+            events = poller.poll(timeout * 1000)
+            if any(event & select.POLLHUP for _, event in events):
+                emulator.drop_output()
+                time.sleep(PTY_IDLE_INTERVAL)
+                continue
+            if events:
+                emulator.write(os.read(master, 4096))
+            data = emulator.read(4096, 0)
+            if data:
+                os.write(master, data)
+
+    thread = threading.Thread(target=serve_proc, name='emulator')
+    thread.daemon = True
+    thread.start()
+    return path
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="amperia firmware emulator on a pseudo terminal")
+    parser.add_argument("model", choices=list(MODELS))
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY)
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER)
+    args = parser.parse_args()
+
+    emulator = create_emulator(args.model, latency=args.latency, jitter=args.jitter)
+    port = serve_pty(emulator)
+    emulator.reset()
+    logger.info(f"{args.model}: {port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info(f"commands served: {emulator.commands}")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
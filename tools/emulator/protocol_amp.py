@@ -0,0 +1,116 @@
+"""
+pyserial url handler for the firmware emulator: amp://<model>[?latency=<s>&jitter=<s>&boot=<s>&log=0]
+registered in serial.protocol_handler_packages by tools.devices.edpro_base
+"""
+from urllib.parse import urlsplit, parse_qs
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError, to_bytes
+
+from tools.emulator.edpro_emulator import FirmwareEmulator, create_emulator
+
+
+class Serial(SerialBase):
+
+    def __init__(self, *args, **kwargs):
+        self.emulator: FirmwareEmulator = None
+        self._reset_held = False
+        super().__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        self.emulator = self._emulator_from_url(self.port)
+        self._reset_held = bool(self._rts_state)
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+        super().close()
+
+    @staticmethod
+    def _emulator_from_url(url: str) -> FirmwareEmulator:
+        parts = urlsplit(url)
+        if parts.scheme != "amp":
+            raise SerialException(f"expected 'amp://<model>[?latency=..&jitter=..]', got: {url}")
+        options = {}
+        try:
+            for option, values in parse_qs(parts.query, True).items():
+                if option == "latency":
+                    options["latency"] = float(values[0])
+                elif option == "jitter":
+                    options["jitter"] = float(values[0])
+                elif option == "boot":
+                    options["boot_time"] = float(values[0])
+                elif option == "log":
+                    options["debug_log"] = values[0] != "0"
+                else:
+                    raise ValueError(f"unknown option: {option}")
+            return create_emulator(parts.netloc, **options)
+        except ValueError as e:
+            raise SerialException(f"invalid emulator url '{url}': {e}")
+
+    def _reconfigure_port(self, *args, **kwargs):
+        pass
+
+    def _update_rts_state(self):
+        # RTS held during open and released afterwards resets the chip (see EdproDevice.connect)
+        if self._rts_state:
+            self._reset_held = True
+        elif self._reset_held:
+            self._reset_held = False
+            self.emulator.reset()
+
+    def _update_dtr_state(self):
+        pass
+
+    def _update_break_state(self):
+        pass
+
+    @property
+    def in_waiting(self) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.emulator.in_waiting()
+
+    def read(self, size=1) -> bytes:
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.emulator.read(size, self._timeout)
+
+    def cancel_read(self):
+        if self.is_open:
+            self.emulator.cancel_read()
+
+    def write(self, data) -> int:
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = to_bytes(data)
+        self.emulator.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+    def reset_output_buffer(self):
+        pass
+
+    @property
+    def cts(self):
+        return False
+
+    @property
+    def dsr(self):
+        return False
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return False
@@ -1,5 +1,6 @@
 from tools.common.esp import flash_espinit, flash_firmware, print_esp_info, UartStr
 from tools.devices.edpro_mm import EdproMM
+from tools.scenarious.device_pool import device_session
 from tools.scenarious.mm_calibration import MMCalibration, MMCalFlags
 from tools.scenarious.mm_test_aac import MMTestAAC
 from tools.scenarious.mm_test_adc import MMTestADC
@@ -27,15 +28,19 @@ def cal_volt_r() -> bool:
 
 
 def test_volt_r() -> bool:
-    if not MMTestVDC().run(): return False
-    if not MMTestVAC(run_fast=True).run(): return False
-    if not MMTestR().run(): return False
+    with device_session():
+        if not MMTestVDC().run(): return False
+        if not MMTestVAC(run_fast=True).run(): return False
+        if not MMTestR().run(): return False
     return True
 
 
 def cal_test_vr() -> bool:
-    if not cal_volt_r(): return False
-    if not test_volt_r(): return False
+    with device_session() as pool:
+        if not cal_volt_r(): return False
+        # calibration is saved with `conf s`: it is verified on the multimeter rebooted with the saved configuration
+        pool.discard("edpro_mm", reboot=True)
+        if not test_volt_r(): return False
     return True
 
 
@@ -44,14 +49,18 @@ def cal_current() -> bool:
 
 
 def test_current() -> bool:
-    if not MMTestADC().run(): return False
-    if not MMTestAAC(run_fast=True).run(): return False
+    with device_session():
+        if not MMTestADC().run(): return False
+        if not MMTestAAC(run_fast=True).run(): return False
     return True
 
 
 def cal_test_c() -> bool:
-    if not cal_current(): return False
-    if not test_current(): return False
+    with device_session() as pool:
+        if not cal_current(): return False
+        # calibration is saved with `conf s`: it is verified on the multimeter rebooted with the saved configuration
+        pool.discard("edpro_mm", reboot=True)
+        if not test_current(): return False
     return True
 
 
@@ -1,5 +1,6 @@
 from tools.common.esp import flash_espinit, flash_firmware, print_esp_info, UartStr
 from tools.devices.edpro_ps import EdproPS
+from tools.scenarious.device_pool import device_session
 from tools.scenarious.ps_calibration import PSCalibration
 from tools.scenarious.ps_test_aac import PSTestAAC
 from tools.scenarious.ps_test_adc import PSTestADC
@@ -22,12 +23,13 @@ def firmware_update():
 
 
 def test_all():
-    if not PSTestVDC().run(): return
-    if not PSTestADC().run(): return
-    if not PSTestFreq().run(): return
-    if not PSTestVAC().run(): return
-    if not PSTestAAC().run(): return
-    if not PSTestLoadDC().run(): return
+    with device_session():
+        if not PSTestVDC().run(): return
+        if not PSTestADC().run(): return
+        if not PSTestFreq().run(): return
+        if not PSTestVAC().run(): return
+        if not PSTestAAC().run(): return
+        if not PSTestLoadDC().run(): return
 
 
 ps_menu = MenuDef([
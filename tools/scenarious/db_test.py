@@ -15,10 +15,7 @@ class DBTest(Scenario):
         super().__init__("test_ca")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_meter()
-        t.use_power()
-        t.use_generator()
+        t.use("devboard", "meter", "power", "generator")
 
         t.cleanup()
         t.test_all()
@@ -60,9 +57,10 @@ class DBTest(Scenario):
             (10, 1_800_000, RigolMode.R_2M),
         ]
 
-        for (n, expected, mode) in data:
+        for (n, expected, mode) in t.points(data):
             t.devboard.set_meas_r(n)
             t.meter.set_mode(mode)
+            t.set_reference_accuracy(expected, 0, 0.10)
 
             t.wait(0.25)
             actual = t.meter.measure_r()
@@ -77,6 +75,7 @@ class DBTest(Scenario):
         t.devboard.set_off()
 
         t.meter.set_mode(RigolMode.VDC_2)
+        t.set_reference_accuracy(0.0, 0.0001, 0)
         t.devboard.set_mm_vgnd(meas_v=True)
 
         t.wait(1.0)
@@ -90,6 +89,7 @@ class DBTest(Scenario):
         expected = 3.0
         t.power.set_volt(expected)
         t.meter.set_mode(RigolMode.VDC_20)
+        t.set_reference_accuracy(expected, 0, 0.05)
         t.devboard.set_mm_vpow(meas_v=True)
 
         t.wait(1.0)
@@ -102,6 +102,7 @@ class DBTest(Scenario):
 
         expected = 2.2
         t.meter.set_mode(RigolMode.VDC_20)
+        t.set_reference_accuracy(expected, 0, 0.05)
         t.power.set_volt(expected)
         t.devboard.set_mm_vpow_rev(meas_v=True)
 
@@ -115,6 +116,7 @@ class DBTest(Scenario):
 
         expected = 2.0
         t.meter.set_mode(RigolMode.VAC_20)
+        t.set_reference_accuracy(expected, 0, 0.05)
         t.generator.set_ac(to_amp(expected), 50)
         t.generator.set_output_on()
         t.devboard.set_mm_vgen(meas_v=True)
@@ -130,6 +132,7 @@ class DBTest(Scenario):
         expected = 0.15
         t.power.set_current(expected)
         t.meter.set_mode(RigolMode.ADC_2A)
+        t.set_reference_accuracy(expected, 0, 0.05)
         t.devboard.set_mm_ipow(meas_i=True)
 
         t.wait(1.0)
@@ -143,6 +146,7 @@ class DBTest(Scenario):
         expected = 0.15
         t.power.set_current(expected)
         t.meter.set_mode(RigolMode.ADC_2A)
+        t.set_reference_accuracy(expected, 0, 0.05)
         t.devboard.set_mm_ipow_rev(meas_i=True)
 
         t.wait(1.0)
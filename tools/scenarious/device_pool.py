@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional, Iterator, List
+
+from tools.common.logger import Logger, LoggedError
+
+logger = Logger("pool")
+
+
+class DevicePool:
+    """
+    keeps instruments connected across chained scenarios:
+    the first scenario opens and validates a device, the following ones get the same instance
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, Any] = {}
+
+    def acquire(self, key: str, opener: Callable[[], Any]) -> Any:
+        device = self._devices.get(key)
+        if device is None:
+            device = opener()
+            self._devices[key] = device
+        else:
+            logger.trace("reuse: %s", key)
+        return device
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._devices.get(key)
+
+    def reset(self):
+        """brings routing back to the initial state between scenarios"""
+        devboard = self._devices.get("devboard")
+        if devboard is None:
+            return
+        try:
+            devboard.set_off()
+        except LoggedError:
+            # devboard is in unknown state, reconnect on next use
+            self.discard("devboard")
+
+    def discard(self, key: str, reboot: bool = False):
+        """closes the device, reboot: the next scenario reboots the edpro device instead of attaching warm"""
+        device = self._devices.pop(key, None)
+        if device is not None:
+            device.close()
+            if reboot:
+                device.reboot_on_attach()
+
+    def close(self):
+        keys: List[str] = list(self._devices.keys())
+        for key in keys:
+            self.discard(key)
+
+
+_active_pool: Optional[DevicePool] = None
+
+
+def active_pool() -> Optional[DevicePool]:
+    return _active_pool
+
+
+@contextmanager
+def device_session() -> Iterator[DevicePool]:
+    """scenarios run inside the block share connected devices, nested sessions reuse the outer one"""
+    global _active_pool
+    if _active_pool is not None:
+        yield _active_pool
+        return
+
+    _active_pool = DevicePool()
+    try:
+        yield _active_pool
+    finally:
+        pool = _active_pool
+        _active_pool = None
+        pool.close()
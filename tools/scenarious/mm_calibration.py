@@ -2,9 +2,15 @@
 from enum import Flag, auto
 
 from tools.common.test import from_amp, to_amp
-from tools.devices.rigol_meter import RigolMode
+from tools.devices.rigol_meter import RigolMode, RigolRate
 from tools.scenarious.scenario import Scenario
 
+# relative point error passed to settle: reference readings of a calibration point are settled
+# when they agree within SETTLE_TOLERANCE of it, 0.25 * 0.4% = 0.1% of the value
+CAL_SETTLE_REL = 0.004
+# calibration values are saved to flash: learned settle waits never go below the former fixed delay
+CAL_SETTLE_MIN = 1.0
+
 
 class MMCalFlags(Flag):
     DC0 = auto()
@@ -28,11 +34,7 @@ class MMCalibration(Scenario):
 
     def on_run(c):
         c.success = False
-        c.use_devboard()
-        c.use_edpro_mm()
-        c.use_meter()
-        c.use_power()
-        c.use_generator()
+        c.use("devboard", "edpro_mm", "meter", "power", "generator")
 
         c.generator.set_output_off()
 
@@ -69,8 +71,10 @@ class MMCalibration(Scenario):
         c.devboard.set_off()
 
         c.power.set_volt(1.0)
+        c.meter.set_rate(RigolRate.SLOW, "VOLTage:DC")
         c.devboard.set_mm_vpow(meas_v=True)
-        c.wait(1)
+        c.settle_wait(c.settle_key("mm_vpow", "vdc"), 1, [c.meter.measure_vdc], 0, CAL_SETTLE_REL,
+                      minimum=CAL_SETTLE_MIN)
         volt = c.meter.measure_vdc()
         c.check_abs(volt, 1.0, 0.1, "Cannot set DC voltage")
         c.edpro_mm.cmd(f"cal vdc {volt:0.6f}")
@@ -81,12 +85,13 @@ class MMCalibration(Scenario):
         c.power.set_volt(4)
         c.wait(1)
 
-        c.meter.set_mode(RigolMode.ADC_2A)
+        c.meter.set_mode(RigolMode.ADC_2A, RigolRate.SLOW)
         c.power.set_current(0.16)
         c.edpro_mm.cmd("mode adc")
         c.devboard.set_mm_ipow(meas_i=True)
 
-        c.wait(1)
+        c.settle_wait(c.settle_key("mm_ipow", "adc"), 1, [c.meter.measure_adc], 0, CAL_SETTLE_REL,
+                      minimum=CAL_SETTLE_MIN)
         curr = c.meter.measure_adc()
         c.check_abs(curr, 0.16, 0.02, "Cannot set DC current")
         c.edpro_mm.cmd(f"cal adc {curr:0.6f}")
@@ -95,7 +100,7 @@ class MMCalibration(Scenario):
         c.print_task("calibrate AC0:")
         c.devboard.set_off()
 
-        c.meter.set_mode(RigolMode.VAC_2)
+        c.meter.set_mode(RigolMode.VAC_2, RigolRate.SLOW)
         c.edpro_mm.cmd("mode vac")
         c.devboard.set_mm_vgnd(meas_v=True)
         c.wait(1.0)
@@ -107,20 +112,22 @@ class MMCalibration(Scenario):
 
         freq = 1000
         c.edpro_mm.cmd("mode vac")
-        c.meter.set_mode(RigolMode.VAC_2)
+        c.meter.set_mode(RigolMode.VAC_2, RigolRate.SLOW)
         c.devboard.set_mm_vgen(meas_v=True)
         c.check(c.generator.get_load() == "OFF", "Generator load must be 'High Z'")
         c.generator.set_output_on()
 
         def cal_point(num: int, value: float, mode: RigolMode):
-            c.logger.info(f"point {num}")
-            expected_v = value
-            c.meter.set_mode(mode)
-            c.generator.set_ac(to_amp(expected_v), freq)
-            c.wait(1.0)
-            actual_v = c.meter.measure_vac()
-            c.check_rel(actual_v, expected_v, 0.1, "Cannot set AC input")
-            c.edpro_mm.cmd(f"cal vac {num} {actual_v:0.6f}")
+            with c.point(f"cal vac {num}"):
+                c.logger.info("point %s", num)
+                expected_v = value
+                c.meter.set_mode(mode, RigolRate.SLOW)
+                c.generator.set_ac(to_amp(expected_v), freq)
+                c.settle_wait(c.settle_key("mm_vgen", "vac", freq), 1.0, [c.meter.measure_vac], 0, CAL_SETTLE_REL,
+                              minimum=CAL_SETTLE_MIN)
+                actual_v = c.meter.measure_vac()
+                c.check_rel(actual_v, expected_v, 0.1, "Cannot set AC input")
+                c.edpro_mm.cmd(f"cal vac {num} {actual_v:0.6f}")
 
         cal_point(1, 0.1, RigolMode.VAC_2)
         cal_point(2, 1.0, RigolMode.VAC_2)
@@ -136,20 +143,22 @@ class MMCalibration(Scenario):
         effective_r = owon_max_amplitude / circuit_max_current
 
         freq = 1000
-        c.meter.set_mode(RigolMode.AAC_2A)
+        c.meter.set_mode(RigolMode.AAC_2A, RigolRate.SLOW)
         c.edpro_mm.cmd("mode aac")
         c.check(c.generator.get_load() == "OFF", "Generator load must be 'High Z'")
         c.generator.set_output_on()
         c.devboard.set_mm_igen(meas_i=True)
 
         def cal_point(num: int, value: float):
-            c.logger.info(f"point {num}")
-            expected_i = value
-            c.generator.set_ac(expected_i * effective_r, freq)
-            c.wait(1.0)
-            actual_i = c.meter.measure_aac()
-            c.check_rel(actual_i, expected_i, 0.1, "Cannot set AC input")
-            c.edpro_mm.cmd(f"cal aac {num} {actual_i:0.6f}")
+            with c.point(f"cal aac {num}"):
+                c.logger.info("point %s", num)
+                expected_i = value
+                c.generator.set_ac(expected_i * effective_r, freq)
+                c.settle_wait(c.settle_key("mm_igen", "aac", freq), 1.0, [c.meter.measure_aac], 0, CAL_SETTLE_REL,
+                              minimum=CAL_SETTLE_MIN)
+                actual_i = c.meter.measure_aac()
+                c.check_rel(actual_i, expected_i, 0.1, "Cannot set AC input")
+                c.edpro_mm.cmd(f"cal aac {num} {actual_i:0.6f}")
 
         cal_point(1, 0.025)
         cal_point(2, 0.050)
@@ -173,15 +182,17 @@ class MMCalibration(Scenario):
         c.edpro_mm.cmd("cal r0")
 
         def cal_range(num: int, rsel: int, r: int, rigol_mode: RigolMode):
-            c.logger.info(f"calibrate range {num}")
-            c.devboard.set_meas_r(rsel)
-            c.meter.set_mode(rigol_mode)
-            c.wait(1)
-            expected = c.meter.measure_r()
-            c.check_rel(expected, r, 0.1, "Cannot set required resistance")
-            c.devboard.set_mm_rsel(rsel)
-            c.wait(0.5)
-            c.edpro_mm.cmd(f"cal r {num} {expected:0.6f}")
+            with c.point(f"cal r {num}"):
+                c.logger.info("calibrate range %s", num)
+                c.devboard.set_meas_r(rsel)
+                c.meter.set_mode(rigol_mode, RigolRate.SLOW)
+                c.settle_wait(c.settle_key(f"meas_r {rsel}", "r"), 1, [c.meter.measure_r], 0, CAL_SETTLE_REL,
+                              minimum=CAL_SETTLE_MIN)
+                expected = c.meter.measure_r()
+                c.check_rel(expected, r, 0.1, "Cannot set required resistance")
+                c.devboard.set_mm_rsel(rsel)
+                c.wait(0.5)
+                c.edpro_mm.cmd(f"cal r {num} {expected:0.6f}")
 
         cal_range(1, rsel=2, r=2_000, rigol_mode=RigolMode.R_20K)
         cal_range(2, rsel=3, r=20_000, rigol_mode=RigolMode.R_200K)
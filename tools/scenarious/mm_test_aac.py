@@ -53,10 +53,7 @@ class MMTestAAC(Scenario):
         super().__init__("test_vac")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_mm()
-        t.use_meter()
-        t.use_generator()
+        t.use("devboard", "edpro_mm", "meter", "generator")
         t.test_aac()
 
         t.generator.set_output_off()
@@ -82,15 +79,16 @@ class MMTestAAC(Scenario):
         circuit_max_current = 0.165
         effective_r = owon_max_amplitude / circuit_max_current
 
-        for d in t.data:
-            t.generator.set_ac(d.c * effective_r, d.f)
-            t.wait(1)
-
-            t.meter.measure_aac()  # duty cycle
-            expected = t.meter.measure_aac()
+        for d in t.points(t.data):
+            t.setup(lambda: t.set_reference_accuracy(d.c, d.abs, d.rel),
+                    lambda: t.generator.set_ac(d.c * effective_r, d.f))
+            key = t.settle_key("mm_igen", "aac", d.f)
+            t.settle(key, [t.meter.measure_aac, t.edpro_mm.get_value], d.abs, d.rel)
+            captured = t.capture(t.meter.measure_aac, t.edpro_mm.get_values)
+            expected = captured.reference
             t.check_rel(expected, d.c, 0.1, f"Required current does not match")
 
-            values = t.edpro_mm.get_values()
+            values = captured.dut
             t.check_str(values.mode, "AAC", "Multimeter mode is invalid")
             t.check(values.finit, "Multimeter result is not finit")
 
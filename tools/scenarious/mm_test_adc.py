@@ -28,10 +28,7 @@ class MMTestADC(Scenario):
         super().__init__("test_adc")
 
     def on_run(t):
-        t.use_edpro_mm()
-        t.use_devboard()
-        t.use_meter()
-        t.use_power()
+        t.use("edpro_mm", "devboard", "meter", "power")
         t.test_adc()
         t.devboard.set_off()
 
@@ -52,20 +49,22 @@ class MMTestADC(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for d in test_data:
+        for d in t.points(test_data):
+            t.set_reference_accuracy(d.curr, ABS_ERROR, REL_ERROR)
             if (d.curr > 0):
                 t.devboard.set_mm_ipow(meas_i=True)
             else:
                 t.devboard.set_mm_ipow_rev(meas_i=True)
 
             t.power.set_current(abs(d.curr))
-            t.wait(1)
-
-            t.meter.measure_adc()  # duty cycle
-            expected = t.meter.measure_adc()
+            route = "mm_ipow" if d.curr > 0 else "mm_ipow_rev"
+            key = t.settle_key(route, "adc")
+            t.settle(key, [t.meter.measure_adc, t.edpro_mm.get_value], ABS_ERROR, REL_ERROR)
+            captured = t.capture(t.meter.measure_adc, t.edpro_mm.get_values)
+            expected = captured.reference
             t.check_rel(expected, d.curr, 0.1, f"Required current does not match")
 
-            values = t.edpro_mm.get_values()
+            values = captured.dut
             t.devboard.set_off()
 
             t.check_str(values.mode, "ADC", "Multimeter mode is invalid")
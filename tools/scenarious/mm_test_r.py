@@ -32,9 +32,7 @@ class MMTestR(Scenario):
         super().__init__("test_r")
 
     def on_run(t):
-        t.use_edpro_mm()
-        t.use_devboard()
-        t.use_meter()
+        t.use("edpro_mm", "devboard", "meter")
         t.test_r()
 
         t.devboard.set_off()
@@ -66,7 +64,7 @@ class MMTestR(Scenario):
         reporter.expect(result)
 
         def test_r(n1: int, n2: int, r: int, rigol_mode: RigolMode):
-            t.logger.info(f"tesr R: {r}")
+            t.logger.info("tesr R: %s", r)
             t.devboard.set_meas_r(n1, n2)
             t.meter.set_mode(rigol_mode)
             t.wait(1)
@@ -50,10 +50,7 @@ class MMTestVAC(Scenario):
         super().__init__("test_vac")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_mm()
-        t.use_meter()
-        t.use_generator()
+        t.use("devboard", "edpro_mm", "meter", "generator")
         t.test_vac()
 
         t.generator.set_output_off()
@@ -75,16 +72,19 @@ class MMTestVAC(Scenario):
 
         reporter = TestReporter(t.tag, t.fail_fast)
 
-        for d in t.data:
-            t.meter.set_vac_range(d.v)
-            t.generator.set_ac(to_amp(d.v), d.f)
-            t.wait(1.25)
+        for d in t.points(t.data):
+            def setup_meter():
+                t.meter.set_vac_range(d.v)
+                t.set_reference_accuracy(d.v, d.abs, d.rel)
 
-            t.meter.measure_vac()  # duty cycle
-            expected = t.meter.measure_vac()
+            t.setup(setup_meter, lambda: t.generator.set_ac(to_amp(d.v), d.f))
+            key = t.settle_key("mm_vgen", "vac", d.f)
+            t.settle(key, [t.meter.measure_vac, t.edpro_mm.get_value], d.abs, d.rel)
+            captured = t.capture(t.meter.measure_vac, t.edpro_mm.get_values)
+            expected = captured.reference
             t.check_rel(expected, d.v, 0.1, f"Required voltage does not match")
 
-            values = t.edpro_mm.get_values()
+            values = captured.dut
             t.check_str(values.mode, "VAC", "Multimeter mode is invalid")
             t.check(values.finit, "Multimeter result is not finit")
 
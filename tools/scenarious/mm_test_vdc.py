@@ -31,10 +31,7 @@ class MMTestVDC(Scenario):
         super().__init__("test_vdc")
 
     def on_run(t):
-        t.use_edpro_mm()
-        t.use_devboard()
-        t.use_meter()
-        t.use_power()
+        t.use("edpro_mm", "devboard", "meter", "power")
         t.test_vdc()
 
         t.devboard.set_off()
@@ -55,21 +52,24 @@ class MMTestVDC(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for d in test_data:
+        for d in t.points(test_data):
             t.meter.set_vdc_range(abs(d.volt))
+            t.set_reference_accuracy(d.volt, ABS_ERROR, REL_ERROR)
             t.power.set_volt(abs(d.volt))
 
             if d.volt < 0 and not is_neg:
                 t.devboard.set_mm_vpow_rev(meas_v=True)
                 is_neg = True
 
-            t.wait(1)
-            t.meter.measure_vdc()  # duty cycle
-            expected = t.meter.measure_vdc()
+            route = "mm_vpow_rev" if is_neg else "mm_vpow"
+            key = t.settle_key(route, "vdc")
+            t.settle(key, [t.meter.measure_vdc, t.edpro_mm.get_value], ABS_ERROR, REL_ERROR)
+            captured = t.capture(t.meter.measure_vdc, t.edpro_mm.get_values)
+            expected = captured.reference
 
             t.check_rel(expected, d.volt, 0.1, f"Required voltage does not match")
 
-            values = t.edpro_mm.get_values()
+            values = captured.dut
             t.check_str(values.mode, "VDC", "Multimeter mode is invalid")
             t.check(values.finit, "Multimeter result is not finit")
 
@@ -1,4 +1,4 @@
-from tools.devices.rigol_meter import RigolMode
+from tools.devices.rigol_meter import RigolMode, RigolRate
 from tools.scenarious.scenario import Scenario
 
 
@@ -8,13 +8,10 @@ class PSCalibration(Scenario):
         super().__init__("ps_cal")
 
     def on_run(c):
-        c.use_devboard()
-        c.use_edpro_ps()
-        c.use_meter()
+        c.use("devboard", "edpro_ps", "meter")
 
         # VOLTAGE
-        c.edpro_ps.cmd("mode dc")
-        c.edpro_ps.cmd("set l 0")
+        c.edpro_ps.cmd_many(["mode dc", "set l 0"])
         c.devboard.set_meas_v()
         c._cal_vdc()
         c._cal_vac()
@@ -32,9 +29,8 @@ class PSCalibration(Scenario):
     def _cal_vdc(c):
         c.print_task("calibrate VDC:")
 
-        c.meter.set_mode(RigolMode.VDC_20)
-        c.edpro_ps.cmd("mode dc")
-        c.edpro_ps.cmd("set l 50")
+        c.meter.set_mode(RigolMode.VDC_20, RigolRate.SLOW)
+        c.edpro_ps.cmd_many(["mode dc", "set l 50"])
         c.wait(0.5)
 
         v = c.meter.measure_vdc()
@@ -46,10 +42,8 @@ class PSCalibration(Scenario):
     def _cal_vac(c):
         c.print_task("calibrate VAC:")
 
-        c.meter.set_mode(RigolMode.VAC_20)
-        c.edpro_ps.cmd("mode ac")
-        c.edpro_ps.cmd("set f 1000")
-        c.edpro_ps.cmd("set l 30")
+        c.meter.set_mode(RigolMode.VAC_20, RigolRate.SLOW)
+        c.edpro_ps.cmd_many(["mode ac", "set f 1000", "set l 30"])
         c.wait(0.5)
 
         v = c.meter.measure_vac()
@@ -60,8 +54,7 @@ class PSCalibration(Scenario):
 
     def _cal_adc0(c):
         c.print_task("calibrate ADC zero:")
-        c.edpro_ps.cmd("mode dc")
-        c.edpro_ps.cmd("set l 0")
+        c.edpro_ps.cmd_many(["mode dc", "set l 0"])
         c.wait(0.5)
         c.edpro_ps.cmd("cal adc0")
 
@@ -69,9 +62,8 @@ class PSCalibration(Scenario):
         c.print_task("calibrate ADC:")
         c.devboard.set_off()
 
-        c.meter.set_mode(RigolMode.ADC_2A)
-        c.edpro_ps.cmd("mode dc")
-        c.edpro_ps.cmd("set l 15")
+        c.meter.set_mode(RigolMode.ADC_2A, RigolRate.SLOW)
+        c.edpro_ps.cmd_many(["mode dc", "set l 15"])
         c.devboard.set_pp_load(1, meas_i=True)
 
         c.wait(0.5)
@@ -81,9 +73,7 @@ class PSCalibration(Scenario):
 
     def _cal_aac0(c):
         c.print_task("calibrate AAC zero:")
-        c.edpro_ps.cmd("mode ac")
-        c.edpro_ps.cmd("set f 1000")
-        c.edpro_ps.cmd("set l 0")
+        c.edpro_ps.cmd_many(["mode ac", "set f 1000", "set l 0"])
         c.wait(1)
         c.edpro_ps.cmd("cal aac0")
 
@@ -91,10 +81,8 @@ class PSCalibration(Scenario):
         c.print_task("calibrate AAC:")
         c.devboard.set_off()
 
-        c.meter.set_mode(RigolMode.AAC_2A)
-        c.edpro_ps.cmd("mode ac")
-        c.edpro_ps.cmd("set f 1000")
-        c.edpro_ps.cmd("set l 15")
+        c.meter.set_mode(RigolMode.AAC_2A, RigolRate.SLOW)
+        c.edpro_ps.cmd_many(["mode ac", "set f 1000", "set l 15"])
         c.devboard.set_pp_load(1, meas_i=True)
 
         c.wait(1)
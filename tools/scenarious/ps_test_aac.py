@@ -40,9 +40,7 @@ class PSTestAAC(Scenario):
         super().__init__("test_aac")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_ps()
-        t.use_meter()
+        t.use("devboard", "edpro_ps", "meter")
         t.test_vac()
 
     def test_vac(t):
@@ -57,18 +55,24 @@ class PSTestAAC(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for d in test_data:
+        for d in t.points(test_data):
             voltage = d.curr * LOAD_R
-            t.edpro_ps.set_volt(voltage)
-            t.edpro_ps.set_freq(d.freq)
-            t.wait(0.5)
 
-            t.meter.measure_aac()  # duty cycle
-            expected = t.meter.measure_aac()
+            def setup_ps():
+                with t.edpro_ps.pipeline():
+                    t.edpro_ps.set_volt(voltage)
+                    t.edpro_ps.set_freq(d.freq)
+
+            t.setup(lambda: t.set_reference_accuracy(d.curr, d.abs, d.rel), setup_ps)
+            t.settle_wait(t.settle_key("pp_load 1", "ac", d.freq), 0.5, [t.meter.measure_aac], d.abs, d.rel)
+
+            # first reading is a duty cycle
+            captured = t.capture(lambda: t.meter.read_samples(1, discard=1).mean, t.edpro_ps.get_values)
+            expected = captured.reference
             expected_diff = 0.02 if d.curr < 0.1 else 0.05
             t.check_abs(expected, d.curr, expected_diff, f"Required current does not match")
 
-            actual = t.edpro_ps.get_values().I
+            actual = captured.dut.I
             result = TResult(actual, expected, d.abs, d.rel)
 
             row = result.row_str(f'freq: {d.freq}Hz | curr: {d.curr:0.2f}A')
@@ -29,9 +29,7 @@ class PSTestADC(Scenario):
         super().__init__("test_adc")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_ps()
-        t.use_meter()
+        t.use("devboard", "edpro_ps", "meter")
         t.test_adc()
         # turn off due to high current
         t.edpro_ps.set_volt(0)
@@ -48,15 +46,17 @@ class PSTestADC(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for d in test_data:
+        for d in t.points(test_data):
+            t.set_reference_accuracy(d.curr, d.abs, d.rel)
             ps_voltage = d.curr * LOAD_R
             t.edpro_ps.set_volt(ps_voltage)
-            t.wait(0.5)
+            t.settle_wait(t.settle_key("pp_load 1", "dc"), 0.5, [t.meter.measure_adc], d.abs, d.rel)
 
-            expected = -t.meter.measure_adc()
+            captured = t.capture(t.meter.measure_adc, t.edpro_ps.get_values)
+            expected = -captured.reference
             t.check_abs(expected, d.curr, 0.1, f"Required current does not match")
 
-            actual = t.edpro_ps.get_values().I
+            actual = captured.dut.I
             result = TResult(actual, expected, d.abs, d.rel)
 
             row = result.row_str(f'curr: {d.curr}A')
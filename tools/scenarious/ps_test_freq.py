@@ -28,9 +28,7 @@ class PSTestFreq(Scenario):
         super().__init__("test_freq")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_ps()
-        t.use_meter()
+        t.use("devboard", "edpro_ps", "meter")
         t.test_freq()
 
     def test_freq(t):
@@ -45,9 +43,9 @@ class PSTestFreq(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for d in test_data:
+        for d in t.points(test_data):
             t.edpro_ps.set_freq(d.freq)
-            t.wait(0.5)
+            t.settle_wait(t.settle_key("meas_v", "ac", d.freq), 0.5, [t.meter.measure_freq], FREQ_ABS, FREQ_REL)
 
             expected = d.freq
             actual = t.meter.measure_freq()
@@ -12,9 +12,7 @@ class PSTestLoadDC(Scenario):
         super().__init__("test_load")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_ps()
-        t.use_meter()
+        t.use("devboard", "edpro_ps", "meter")
 
         t.test_load_dc()
         t.test_load_short()
@@ -43,7 +41,7 @@ class PSTestLoadDC(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for volt in [0.2, 0.4, 0.8, 2, 4, 5]:
+        for volt in t.points([0.2, 0.4, 0.8, 2, 4, 5]):
             t.edpro_ps.set_volt(volt)
             t.wait(0.5)
             initial_values = t.edpro_ps.get_values()
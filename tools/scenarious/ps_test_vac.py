@@ -45,9 +45,7 @@ class PSTestVAC(Scenario):
         super().__init__("test_vac")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_ps()
-        t.use_meter()
+        t.use("devboard", "edpro_ps", "meter")
         t.test_vac()
 
     def test_vac(t):
@@ -63,17 +61,22 @@ class PSTestVAC(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for d in test_data:
-            t.edpro_ps.set_volt(d.volt)
-            t.edpro_ps.set_freq(d.freq)
-            t.wait(0.5)
+        for d in t.points(test_data):
+            def setup_ps():
+                with t.edpro_ps.pipeline():
+                    t.edpro_ps.set_volt(d.volt)
+                    t.edpro_ps.set_freq(d.freq)
 
-            t.meter.measure_vac()  # duty cycle
-            expected = t.meter.measure_vac()
+            t.setup(lambda: t.set_reference_accuracy(d.volt, d.abs, d.rel), setup_ps)
+            t.settle_wait(t.settle_key("meas_v", "ac", d.freq), 0.5, [t.meter.measure_vac], d.abs, d.rel)
+
+            # first reading is a duty cycle
+            captured = t.capture(lambda: t.meter.read_samples(1, discard=1).mean, t.edpro_ps.get_values)
+            expected = captured.reference
             expected_diff = 0.05 if d.volt < 0.15 else 0.1
             t.check_abs(expected, d.volt, expected_diff, f"Required voltage does not match")
 
-            actual = t.edpro_ps.get_values().U
+            actual = captured.dut.U
             result = TResult(actual, expected, d.abs, d.rel)
 
             row = result.row_str(f'freq: {d.freq}Hz | volt: {d.volt:0.1f}V')
@@ -40,9 +40,7 @@ class PSTestVDC(Scenario):
         super().__init__("test_vdc")
 
     def on_run(t):
-        t.use_devboard()
-        t.use_edpro_ps()
-        t.use_meter()
+        t.use("devboard", "edpro_ps", "meter")
         t.test_vdc()
 
     def test_vdc(t):
@@ -57,14 +55,16 @@ class PSTestVDC(Scenario):
 
         reporter = TestReporter(t.tag)
 
-        for d in test_data:
+        for d in t.points(test_data):
+            t.set_reference_accuracy(d.volt, d.abs, d.rel)
             t.edpro_ps.set_volt(d.volt)
-            t.wait(0.5)
+            t.settle_wait(t.settle_key("meas_v", "dc"), 0.5, [t.meter.measure_vdc], d.abs, d.rel)
 
-            expected = t.meter.measure_vdc()
+            captured = t.capture(t.meter.measure_vdc, t.edpro_ps.get_values)
+            expected = captured.reference
             t.check_abs(expected, d.volt, VDC_STEP_ABS, f"Required voltage does not match")
 
-            actual = t.edpro_ps.get_values().U
+            actual = captured.dut.U
             result = TResult(actual, expected, d.abs, d.rel)
             reporter.trace(result.row_str(f'volt: {d.volt}V'))
             reporter.expect(result)
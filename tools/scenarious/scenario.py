@@ -1,15 +1,54 @@
+import json
+import os
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from contextlib import contextmanager
+from functools import partial
+from typing import Optional, Callable, Any, Iterable, Iterator, TypeVar, Dict, Sequence, List, NamedTuple, Tuple
 
+from tools.common import clock, timeline
+from tools.common.clock import VirtualClock, set_clock
 from tools.common.logger import LoggedError, Logger
 from tools.common.screen import Colors
-from tools.common.test import erel, rel_str, eabs
+from tools.common.test import erel, rel_str, eabs, emax
+from tools.devices.edpro_base import EdproDevice
 from tools.devices.edpro_db import EdproDevBoard
 from tools.devices.edpro_mm import EdproMM
 from tools.devices.edpro_ps import EdproPS
 from tools.devices.owon_generator import OwonGenerator
 from tools.devices.owon_power import OwonPower
 from tools.devices.rigol_meter import RigolMeter
+from tools.devices.scpi import ScpiTransport
+from tools.scenarious.device_pool import DevicePool, active_pool
+from tools.scenarious.settle import SettleResult, is_settled, SETTLE_TIMEOUT, SETTLE_POLL_INTERVAL, SETTLE_COUNT, \
+    SETTLE_DISCARD, SETTLE_MIN_WAIT, settle_key, settle_table, set_settle_table, SettleTable
+
+# Chrome trace JSON of every scenario run is saved here, open with chrome://tracing or ui.perfetto.dev
+TRACE_DIR = os.environ.get("AMP_TRACE_DIR", "trace")
+# reference meter must resolve this fraction of the test point tolerance
+REFERENCE_RATIO = 10
+# number of slowest test points in the budget report
+BUDGET_TOP_POINTS = 10
+# AMP_SIM=1 runs scenarios on the simulated bench: DUT firmware emulators and simulated reference instruments
+SIMULATION = os.environ.get("AMP_SIM") == "1"
+# simulated runs wait in virtual time, AMP_SIM_CLOCK=real keeps real time waits
+if SIMULATION and os.environ.get("AMP_SIM_CLOCK") != "real":
+    set_clock(VirtualClock())
+# settle times of the simulated bench are learned in memory, they must not get into the station table
+if SIMULATION:
+    set_settle_table(SettleTable(None))
+
+T = TypeVar("T")
+
+
+class PointCapture(NamedTuple):
+    """reference and DUT readings taken at the same time, times are clock.now() at the middle of each request"""
+    reference: Any
+    dut: Any
+    reference_time: float
+    dut_time: float
+    # dut_time - reference_time
+    skew: float
 
 
 class Scenario:
@@ -24,38 +63,92 @@ class Scenario:
         self.tag: str = tag
         self.logger: Logger = Logger(tag)
         self.success: bool = True
+        self.pool: Optional[DevicePool] = active_pool()
+        self.settle_results: List[SettleResult] = []
+        self.captures: List[PointCapture] = []
+        self._point_executor: Optional[ThreadPoolExecutor] = None
+
+    def _acquire(self, key: str, opener: Callable[[], Any]) -> Any:
+        if self.pool is not None:
+            return self.pool.acquire(key, opener)
+        return opener()
+
+    @staticmethod
+    def _open_edpro(device: EdproDevice, devmode: bool) -> Any:
+        try:
+            device.attach(devmode)
+        except Exception:
+            device.close()
+            raise
+        return device
+
+    @staticmethod
+    def _open_instrument(device: Any) -> Any:
+        try:
+            device.connect()
+        except Exception:
+            device.close()
+            raise
+        return device
+
+    @staticmethod
+    def _edpro(device: EdproDevice) -> EdproDevice:
+        """explicit AMP_PORT_<TAG> wins over the simulated bench"""
+        if SIMULATION and device.port is None:
+            from tools.emulator.bench import SIM_PORTS, sim_bench
+            # bench attaches to the emulator models as they are created
+            sim_bench()
+            device.port = SIM_PORTS[device.tag]
+        return device
+
+    @staticmethod
+    def _sim_transport(instrument: str) -> Optional[ScpiTransport]:
+        if not SIMULATION:
+            return None
+        from tools.emulator.bench import sim_bench
+        return sim_bench().transport(instrument)
 
     def use_devboard(self):
-        self.devboard = EdproDevBoard()
-        self.devboard.connect()
-        self.devboard.wait_boot_complete()
-        self.devboard.validate_firmware()
+        self.devboard = self._acquire("devboard",
+                                      lambda: self._open_edpro(self._edpro(EdproDevBoard()), devmode=False))
 
     def use_edpro_mm(self):
-        self.edpro_mm = EdproMM()
-        self.edpro_mm.connect()
-        self.edpro_mm.wait_boot_complete()
-        self.edpro_mm.validate_firmware()
-        self.edpro_mm.set_devmode()
+        self.edpro_mm = self._acquire("edpro_mm", lambda: self._open_edpro(self._edpro(EdproMM()), devmode=True))
 
     def use_edpro_ps(self):
-        self.edpro_ps = EdproPS()
-        self.edpro_ps.connect()
-        self.edpro_ps.wait_boot_complete()
-        self.edpro_ps.validate_firmware()
-        self.edpro_ps.set_devmode()
+        self.edpro_ps = self._acquire("edpro_ps", lambda: self._open_edpro(self._edpro(EdproPS()), devmode=True))
 
     def use_power(self):
-        self.power = OwonPower()
-        self.power.connect()
+        self.power = self._acquire("power",
+                                   lambda: self._open_instrument(OwonPower(self._sim_transport("power"))))
 
     def use_meter(self):
-        self.meter = RigolMeter()
-        self.meter.connect()
+        self.meter = self._acquire("meter",
+                                   lambda: self._open_instrument(RigolMeter(self._sim_transport("meter"))))
 
     def use_generator(self):
-        self.generator = OwonGenerator()
-        self.generator.connect()
+        self.generator = self._acquire("generator",
+                                       lambda: self._open_instrument(OwonGenerator(self._sim_transport("generator"))))
+
+    def use(self, *names: str):
+        """
+        brings up instruments concurrently, names are use_* suffixes: t.use("devboard", "edpro_mm", "meter"),
+        all failures are reported, devices opened so far are released by run()
+        """
+        with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="use") as executor:
+            futures = [(name, executor.submit(clock.forked(getattr(self, f"use_{name}")))) for name in names]
+
+        failed = []
+        for name, future in futures:
+            e = future.exception()
+            if e is None:
+                continue
+            failed.append(name)
+            if not isinstance(e, LoggedError):
+                self.logger.error(f"{name}: {e}")
+
+        if failed:
+            self.logger.throw(f"Cannot bring up: {', '.join(failed)}")
 
     def fail(self, msg: str):
         self.logger.throw(msg)
@@ -97,12 +190,155 @@ class Scenario:
 
     @staticmethod
     def wait(seconds: float):
-        time.sleep(seconds)
+        time_start = clock.now()
+        clock.sleep(seconds)
+        timeline.record("wait", f"wait {seconds}", time_start)
+
+    def settle(self, label: str, sources: Sequence[Callable[[], float]],
+               abs_err: Optional[float], rel_err: Optional[float],
+               timeout: float = SETTLE_TIMEOUT) -> SettleResult:
+        """
+        polls sources (reference meter, DUT or both, read at the same time) until consecutive readings of each one agree
+        within the point error and do not drift, values of the result are the last readings;
+        the first readings after the setup change are dropped as stale;
+        not settled in timeout is only a warning, the point check decides.
+        """
+        time_start = clock.now()
+        history: List[List[float]] = [[] for _ in sources]
+        poll_times: List[float] = []
+        for _ in range(SETTLE_DISCARD):
+            # conversion may have started before the setup change
+            self.read_concurrently(sources)
+            self.wait(SETTLE_POLL_INTERVAL)
+        while True:
+            poll_times.append(clock.now() - time_start)
+            for readings, (value, _) in zip(history, self.read_concurrently(sources)):
+                readings.append(value)
+            elapsed = clock.now() - time_start
+            settled = all(is_settled(readings, abs_err, rel_err) for readings in history)
+            if settled or elapsed >= timeout:
+                break
+            self.wait(SETTLE_POLL_INTERVAL)
+
+        stable_after = poll_times[-SETTLE_COUNT] if settled else elapsed
+        result = SettleResult(label, settled, elapsed, stable_after, len(history[0]),
+                              [readings[-1] for readings in history])
+        self.settle_results.append(result)
+        if settled:
+            self.logger.trace("settled in %.2fs (%d readings): %s", elapsed, result.readings, label)
+        else:
+            self.logger.warn("not settled in %.2fs: %s %s", elapsed, label, result.values)
+        return result
+
+    @staticmethod
+    def _timed_read(read: Callable[[], T]) -> Tuple[T, float]:
+        time_start = clock.now()
+        value = read()
+        return value, (time_start + clock.now()) / 2
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._point_executor is None:
+            self._point_executor = ThreadPoolExecutor(thread_name_prefix="point")
+        return self._point_executor
+
+    def _run_concurrently(self, calls: Sequence[Callable[[], T]]) -> List[T]:
+        """
+        first call runs on the calling thread, the others on the point pool;
+        all of them are joined, then the first failure is raised
+        """
+        # in virtual time the calls overlap: each one starts at the current time
+        calls = [clock.forked(call) for call in calls]
+        futures = [self._executor().submit(call) for call in calls[1:]]
+        try:
+            first = calls[0]()
+        finally:
+            wait_futures(futures)
+        return [first, *(future.result() for future in futures)]
+
+    def read_concurrently(self, reads: Sequence[Callable[[], Any]]) -> List[Tuple[Any, float]]:
+        """
+        runs reads of different instruments at the same time,
+        returns (value, time) of each read, time is clock.now() at the middle of the request
+        """
+        return self._run_concurrently([partial(self._timed_read, read) for read in reads])
+
+    def setup(self, *actions: Callable[[], Any]):
+        """
+        runs independent setup actions of a point concurrently and joins them before settling,
+        every action must target its own instruments:
+        t.setup(lambda: t.meter.set_vac_range(v), lambda: t.generator.set_ac(amp, freq))
+        """
+        self._run_concurrently(actions)
+
+    def capture(self, reference: Callable[[], Any], dut: Callable[[], Any]) -> PointCapture:
+        """
+        triggers the reference reading and the DUT request at the same time:
+        t.capture(t.meter.measure_vdc, t.edpro_mm.get_values)
+        """
+        (reference_value, reference_time), (dut_value, dut_time) = self.read_concurrently([reference, dut])
+        result = PointCapture(reference_value, dut_value, reference_time, dut_time, dut_time - reference_time)
+        self.captures.append(result)
+        self.logger.trace("capture skew: %.1fms", result.skew * 1000)
+        return result
+
+    def set_reference_accuracy(self, expected: float, abs_err: Optional[float], rel_err: Optional[float]):
+        """selects reference meter reading rate from the tolerance of a test point, call after the meter mode"""
+        self.meter.set_accuracy(emax(expected, abs_err or 0.0, rel_err or 0.0) / REFERENCE_RATIO)
+
+    def settle_key(self, route: str, mode: str, freq: Optional[float] = None) -> str:
+        """settle table key of a devboard route and DUT mode, reference range is the current meter mode"""
+        meter_range = None
+        if self.meter is not None and self.meter.mode is not None:
+            meter_range = self.meter.mode.name
+        return settle_key(route, mode, meter_range, freq)
+
+    def settle_wait(self, key: str, default: float, sources: Sequence[Callable[[], float]] = (),
+                    abs_err: Optional[float] = None, rel_err: Optional[float] = None,
+                    minimum: float = SETTLE_MIN_WAIT):
+        """
+        waits the settle time learned for key (see settle_key) instead of the call site default,
+        but not less than minimum; with sources the readings are polled (see settle) while learning
+        and from time to time afterwards, observed settle times are recorded to the settle table
+        """
+        table = settle_table()
+        if sources and table.should_poll(key):
+            result = self.settle(key, sources, abs_err, rel_err)
+            if result.settled:
+                table.record(key, result.stable_after)
+            return
+        seconds = table.learned(key)
+        if seconds is None:
+            seconds = default
+        seconds = max(seconds, minimum)
+        self.logger.trace("settle wait %.2fs: %s", seconds, key)
+        self.wait(seconds)
+
+    @staticmethod
+    @contextmanager
+    def point(label: str):
+        """records time of one test point for the budget report"""
+        time_start = clock.now()
+        try:
+            yield
+        finally:
+            timeline.record(timeline.POINT, label, time_start)
+
+    def points(self, data: Iterable[T]) -> Iterator[T]:
+        """yields test points recording time of each one: for d in t.points(t.data)"""
+        for d in data:
+            with self.point(repr(d)):
+                yield d
 
     def on_run(self):
         pass
 
     def _dispose(self):
+        if self._point_executor is not None:
+            self._point_executor.shutdown()
+            self._point_executor = None
+        if self.pool is not None:
+            self.pool.reset()
+            return
         if (self.edpro_mm):
             self.edpro_mm.close()
         if (self.edpro_ps):
@@ -116,8 +352,59 @@ class Scenario:
         if (self.generator):
             self.generator.close()
 
+    def _firmware_versions(self) -> Dict[str, str]:
+        versions = {}
+        for device in [self.edpro_mm, self.edpro_ps, self.devboard]:
+            if device is not None and device.info is not None:
+                versions[device.tag] = device.info.version
+        return versions
+
+    def _report_timeline(self, tl: timeline.Timeline):
+        for line in tl.summary_lines():
+            self.logger.info(line)
+
+        budget = tl.budget(BUDGET_TOP_POINTS)
+        budget["success"] = self.success
+        budget["firmware"] = self._firmware_versions()
+        budget["virtual_clock"] = clock.get_clock().virtual
+        budget["settle"] = [{"label": r.label, "settled": r.settled, "elapsed": r.elapsed,
+                             "stable_after": r.stable_after, "readings": r.readings}
+                            for r in self.settle_results]
+        total = budget["total"]
+        parts = [f"wait {budget['wait']:.2f}s", *(f"{k} {v:.2f}s" for k, v in budget["io"].items()),
+                 f"compute {budget['compute']:.2f}s"]
+        self.logger.info("budget%s: %.2fs = %s", " (virtual clock)" if budget["virtual_clock"] else "", total,
+                         " + ".join(parts))
+        for label in dict.fromkeys(r.label for r in self.settle_results):
+            elapsed = [r.elapsed for r in self.settle_results if r.label == label]
+            self.logger.info("settle: %s | n=%d avg=%.2fs max=%.2fs", label, len(elapsed),
+                             sum(elapsed) / len(elapsed), max(elapsed))
+        if self.captures:
+            skews = [abs(c.skew) for c in self.captures]
+            budget["capture_skew"] = {"count": len(skews), "avg": sum(skews) / len(skews), "max": max(skews)}
+            self.logger.info("capture: n=%d skew avg=%.1fms max=%.1fms", len(skews),
+                             sum(skews) / len(skews) * 1000, max(skews) * 1000)
+        for point in budget["slowest_points"]:
+            self.logger.info("slow point: %.2fs (wait %.2fs) %s", point["total"], point["wait"], point["point"])
+
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"{self.tag}_{time.strftime('%Y%m%d_%H%M%S')}")
+        tl.save(path + ".json")
+        with open(path + "_budget.json", "w") as f:
+            json.dump(budget, f, indent=2)
+        self.logger.info("trace: %s.json", path)
+
+    def _save_reports(self, tl: timeline.Timeline):
+        """settle table and run report, their errors are logged and do not mask the error of the run"""
+        try:
+            settle_table().save()
+            self._report_timeline(tl)
+        except Exception as e:
+            self.logger.error(f"cannot save reports: {e}")
+
     def run(self) -> bool:
         self.logger.print(Colors.GREEN, "begin")
+        tl = timeline.start_timeline(self.tag)
 
         try:
             self.on_run()
@@ -129,6 +416,8 @@ class Scenario:
             raise
         finally:
             self._dispose()
+            timeline.stop_timeline()
+            self._save_reports(tl)
 
         if self.success:
             self.logger.print(Colors.GREEN, "===")
@@ -0,0 +1,148 @@
+import json
+import math
+import os
+from typing import NamedTuple, List, Optional, Sequence, Dict
+
+from tools.common.logger import Logger
+from tools.common.test import emax
+
+logger = Logger("settle")
+
+# consecutive readings of every source which must agree, they span (SETTLE_COUNT - 1) * SETTLE_POLL_INTERVAL
+SETTLE_COUNT = 3
+# readings agree when they differ less than this fraction of the point error (abs + rel * value)
+SETTLE_TOLERANCE = 0.25
+# above the update period of the slowest source (DM3058 at slow rate), so each poll gets a new conversion
+SETTLE_POLL_INTERVAL = 0.5
+# first readings after a setup change are dropped: DM3058 and DUT `v` may still return the last conversion
+SETTLE_DISCARD = 1
+SETTLE_TIMEOUT = 5.0
+
+# station-local table of observed settle times, learned across runs
+SETTLE_TABLE_PATH = os.environ.get("AMP_SETTLE_TABLE", "settle_table.json")
+# latest observations kept per key
+SETTLE_HISTORY = 100
+# observations required before the learned time replaces the call site constant
+SETTLE_MIN_SAMPLES = 10
+# every n-th settle_wait() of a key polls again to keep the table up to date
+SETTLE_RELEARN = 10
+# safe wait = p99 * SETTLE_MARGIN + SETTLE_MARGIN_ABS
+SETTLE_MARGIN = 1.25
+SETTLE_MARGIN_ABS = 0.05
+# learned waits never go below one update period of the slowest source, call sites may require more
+SETTLE_MIN_WAIT = 0.5
+
+
+class SettleResult(NamedTuple):
+    label: str
+    settled: bool
+    elapsed: float
+    # time until the first of the agreeing readings had been started
+    stable_after: float
+    readings: int
+    values: List[float]
+
+
+def settle_tolerance(value: float, abs_err: Optional[float], rel_err: Optional[float]) -> float:
+    return SETTLE_TOLERANCE * emax(value, abs_err or 0.0, rel_err or 0.0)
+
+
+def remaining_drift(values: Sequence[float], tolerance: float) -> float:
+    """
+    change still to come when the last three readings approach their end value exponentially,
+    0 when they do not move in one direction by more than noise
+    """
+    if len(values) < 3 or abs(values[-1] - values[-3]) <= tolerance / 2:
+        return 0.0
+    step_1, step_2 = values[-2] - values[-3], values[-1] - values[-2]
+    if step_1 * step_2 <= 0:
+        return 0.0
+    ratio = step_2 / step_1
+    if ratio >= 1:
+        return math.inf
+    return abs(step_2) * ratio / (1 - ratio)
+
+
+def is_settled(history: Sequence[float], abs_err: Optional[float], rel_err: Optional[float],
+               count: int = SETTLE_COUNT) -> bool:
+    """last count readings are finite, agree within the tolerance of the latest one and do not drift"""
+    if len(history) < count:
+        return False
+    last = history[-count:]
+    if not all(math.isfinite(v) for v in last):
+        return False
+    tolerance = settle_tolerance(last[-1], abs_err, rel_err)
+    return max(last) - min(last) <= tolerance and remaining_drift(last, tolerance) <= tolerance
+
+
+def freq_band(freq: Optional[float]) -> str:
+    """decade band of a signal frequency: 50 -> '100Hz', 1000 -> '1000Hz', None -> 'dc'"""
+    if freq is None:
+        return "dc"
+    return f"{10 ** max(0, math.ceil(math.log10(freq)))}Hz"
+
+
+def settle_key(route: str, mode: str, meter_range: Optional[str] = None, freq: Optional[float] = None) -> str:
+    """settle table key: devboard route, DUT mode, reference range and frequency band"""
+    return f"{route}|{mode}|{meter_range or '-'}|{freq_band(freq)}"
+
+
+class SettleTable:
+    """observed settle times by key, path None keeps the table in memory only"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.samples: Dict[str, List[float]] = {}
+        self._uses: Dict[str, int] = {}
+        self._dirty = False
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.samples = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warn("cannot load %s: %s", path, e)
+
+    def record(self, key: str, seconds: float):
+        samples = self.samples.setdefault(key, [])
+        samples.append(round(seconds, 4))
+        del samples[:-SETTLE_HISTORY]
+        self._dirty = True
+
+    def learned(self, key: str) -> Optional[float]:
+        """statistically safe settle time, None while there are not enough observations"""
+        samples = self.samples.get(key, [])
+        if len(samples) < SETTLE_MIN_SAMPLES:
+            return None
+        values = sorted(samples)
+        p99 = values[min(len(values) - 1, math.ceil(0.99 * len(values)) - 1)]
+        return p99 * SETTLE_MARGIN + SETTLE_MARGIN_ABS
+
+    def should_poll(self, key: str) -> bool:
+        """True while learning the key and on every SETTLE_RELEARN-th use afterwards"""
+        uses = self._uses.get(key, 0)
+        self._uses[key] = uses + 1
+        return self.learned(key) is None or uses % SETTLE_RELEARN == SETTLE_RELEARN - 1
+
+    def save(self):
+        if not self._dirty or self.path is None:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.samples, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+_table: Optional[SettleTable] = None
+
+
+def settle_table() -> SettleTable:
+    global _table
+    if _table is None:
+        _table = SettleTable(SETTLE_TABLE_PATH)
+    return _table
+
+
+def set_settle_table(table: SettleTable):
+    global _table
+    _table = table